@@ -0,0 +1,823 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from contacts import ENGINES, AddressBook, Birthday, Name, Phone, Record
+from contacts.storage import Storage
+from hometask2 import router
+from concurrentbook import ConcurrentAddressBook
+from shardedbook import ShardedAddressBook
+from vectorbirthdays import BirthdayColumns, np
+
+
+# Layout of the contact model before the compact storage: every object carries a __dict__,
+# phones are a list of Phone objects and the birthday is a Birthday object wrapping a date
+class LegacyField:
+    def __init__(self, value):
+        self.value = value
+
+class LegacyRecord:
+    def __init__(self, name: str, phones: list[str], birthday: date):
+        self.name = LegacyField(name)
+        self.phones = [LegacyField(phone) for phone in phones]
+        self.birthday = LegacyField(birthday)
+
+
+# Synthetic contacts: unique names, one or two phones and a birthday
+def generate_contacts(count: int, seed: int = 0, phones: tuple[int, int] = (1, 2), birthdays: str = "uniform",
+                      feb29_share: float = 0.0):
+    """
+    Yield (name, phones, birthday) tuples for the contacts user0 ... user<count - 1>.
+
+    Args:
+        count (int): The number of contacts.
+        seed (int): Seed of the generator, the same arguments always give the same contacts.
+        phones (tuple[int, int]): The least and the most phones of a contact.
+        birthdays (str): "uniform" spreads the birthdays over 1950-2004, "clustered" puts them
+                         within three days of the first of a month, "none" leaves them unset (None).
+        feb29_share (float): The share of contacts born on February 29.
+    """
+    rnd = random.Random(seed)
+    first_day = date(1950, 1, 1).toordinal()
+    for i in range(count):
+        numbers = [f"{rnd.randrange(10**10):010d}" for _ in range(rnd.randint(*phones))]
+        if birthdays == "none":
+            birthday = None
+        elif feb29_share and rnd.random() < feb29_share:
+            birthday = date(1952 + 4 * rnd.randrange(13), 2, 29)
+        elif birthdays == "clustered":
+            birthday = date(rnd.randint(1950, 2004), rnd.randint(1, 12), 1) + timedelta(days=rnd.randint(-3, 3))
+        else:
+            birthday = date.fromordinal(first_day + rnd.randrange(365 * 55))
+        yield f"user{i}", numbers, birthday
+
+
+def measure_memory(build) -> int:
+    """Return the number of bytes still allocated by the object built by `build`."""
+    return measure_memory_peak(build)[0]
+
+
+def measure_memory_peak(build) -> tuple[int, int]:
+    """Return the bytes still allocated by the object built by `build` and the most allocated while building it."""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return current, peak
+
+
+def bench_memory(count: int) -> None:
+    """Compare the memory used by the legacy and the compact record layouts."""
+    contacts = list(generate_contacts(count))
+
+    def build_legacy():
+        return {name: LegacyRecord(name, phones, birthday) for name, phones, birthday in contacts}
+
+    def build_record(name, phones, birthday):
+        record = Record(name)
+        for phone in phones:
+            record.add_phone(phone)
+        record.add_birthday(birthday.strftime("%d.%m.%Y"))
+        return record
+
+    def build_compact():
+        return {name: build_record(name, phones, birthday) for name, phones, birthday in contacts}
+
+    def build_book(engine):
+        book = ENGINES[engine]()
+        for name, phones, birthday in contacts:
+            book.add_record(build_record(name, phones, birthday))
+        return book
+
+    print(f"records: {count}")
+    builds = [("legacy layout", build_legacy), ("compact layout", build_compact)]
+    builds += [(f"{engine} engine", lambda engine=engine: build_book(engine)) for engine in ENGINES]
+    for title, build in builds:
+        used = measure_memory(build)
+        print(f"{title:18} {used / 2**20:8.1f} MiB ({used / count:6.1f} bytes/record)")
+
+
+def bench_parsing(count: int) -> None:
+    """Compare strptime with the Birthday and Phone fast-path validation."""
+    contacts = list(generate_contacts(count))
+    birthdays = [birthday.strftime("%d.%m.%Y") for _, _, birthday in contacts]
+    phones = [phones[0] for _, phones, _ in contacts]
+
+    for title, parse, values in (
+        ("strptime", lambda value: datetime.strptime(value, "%d.%m.%Y").date(), birthdays),
+        ("Birthday.try_parse", Birthday.try_parse, birthdays),
+        ("Birthday()", Birthday, birthdays),
+        ("Phone.is_valid", Phone.is_valid, phones),
+        ("Phone()", Phone, phones),
+    ):
+        start = time.perf_counter()
+        for value in values:
+            parse(value)
+        elapsed = time.perf_counter() - start
+        print(f"{title:20} {count / elapsed:12,.0f} values/sec")
+
+
+def build_book(count: int, engine: str = "indexed", **contacts) -> AddressBook:
+    """Build a book of generated contacts through the public API; `contacts` go to generate_contacts."""
+    book = ENGINES[engine]()
+    for name, phones, birthday in generate_contacts(count, **contacts):
+        record = Record(name)
+        for phone in phones:
+            record.add_phone(phone)
+        if birthday is not None:
+            record.add_birthday(birthday.strftime("%d.%m.%Y"))
+        book.add_record(record)
+    return book
+
+
+def bench_storage(count: int, journal: int) -> None:
+    """Measure snapshot writing, journal appends and the startup load of a persisted book."""
+    path = tempfile.mkdtemp(prefix="addressbook-bench-")
+    try:
+        book = build_book(count)
+        storage = Storage(path, compact_every=10**12)
+        storage.load(AddressBook())
+        storage._book = book
+        start = time.perf_counter()
+        storage.compact()
+        print(f"snapshot write ({count} records): {time.perf_counter() - start:8.2f} s")
+
+        book._journal = storage
+        start = time.perf_counter()
+        for i in range(journal):
+            book.find(f"user{i % count}").add_phone(f"{i:010d}")
+        storage.sync()
+        elapsed = time.perf_counter() - start
+        print(f"journal append ({journal} entries): {elapsed:8.2f} s ({journal / elapsed:,.0f} entries/sec)")
+        storage._release()
+        del book
+
+        gc.collect()
+        start = time.perf_counter()
+        loaded = Storage(path).load(AddressBook())
+        print(f"load snapshot + journal tail:   {time.perf_counter() - start:8.2f} s ({len(loaded)} records)")
+    finally:
+        shutil.rmtree(path)
+
+
+def _import_time_us(module: str) -> int:
+    """Cumulative import time of a module in a fresh interpreter, as reported by -X importtime."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True).stderr
+    for line in output.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise RuntimeError(f"No import time reported for {module}.")
+
+
+def _read_until(fd: int, marker: bytes, output: bytearray) -> None:
+    while marker not in output:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            raise RuntimeError(f"The bot exited before writing {marker!r}.")
+        output += chunk
+
+
+def _interactive_startup(path: str, command: str) -> tuple[float, float]:
+    """
+    Start the bot on a terminal as a user would and time its first prompt, then the reply to `command`
+    typed right away. Returns both times in seconds from the start of the process.
+    """
+    import pty  # POSIX only, like the rest of this benchmark
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hometask2.py")
+    terminal, bot_side = pty.openpty()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, script, "--data-dir", path], stdin=bot_side,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    os.close(bot_side)
+    try:
+        output = bytearray()
+        _read_until(process.stdout.fileno(), b"Enter a command: ", output)
+        prompt = time.perf_counter() - start
+        os.write(terminal, command.encode() + b"\n")
+        output.clear()
+        _read_until(process.stdout.fileno(), b"Enter a command: ", output)
+        reply = time.perf_counter() - start
+        os.write(terminal, b"exit\n")
+        process.wait()
+    finally:
+        os.close(terminal)
+        process.stdout.close()
+    return prompt, reply
+
+
+def bench_startup(count: int, repeats: int) -> None:
+    """
+    Measure the cold start of the bot on a persisted book of `count` contacts: the import time
+    (python -X importtime), the time to the first prompt and to the first replies, and the parts
+    of the load in process: the records, then the indexes built on demand.
+    """
+    path = tempfile.mkdtemp(prefix="addressbook-bench-")
+    try:
+        storage = Storage(path, compact_every=10**12)
+        book = storage.load(AddressBook())
+        book._journal = None
+        book._restore_records((name, [int(phone) for phone in phones], birthday.toordinal() if birthday else 0)
+                              for name, phones, birthday in generate_contacts(count))
+        storage.compact()
+        storage._release()
+        phone = f"{book.find(f'user{count - 1}')._phones[0]:010d}"
+        del book
+        gc.collect()
+
+        imports = min(_import_time_us("hometask2") for _ in range(repeats))
+        print(f"import hometask2:             {imports / 1e3:8.1f} ms")
+        for command in ("hello", f"find-phone {phone}", "search user12345"):
+            prompt, reply = min(_interactive_startup(path, command) for _ in range(repeats))
+            print(f"first prompt / {command:>22} reply: {prompt:6.2f} s / {reply:6.2f} s")
+
+        start = time.perf_counter()
+        loaded = Storage(path).load(AddressBook())
+        print(f"load records ({len(loaded)}):      {time.perf_counter() - start:8.2f} s")
+        for label, query in (("phone index", lambda: loaded.find_by_phone(phone)),
+                             ("name index", lambda: loaded.search(prefix="user12345"))):
+            start = time.perf_counter()
+            query()
+            print(f"first query building the {label}: {time.perf_counter() - start:6.2f} s")
+    finally:
+        shutil.rmtree(path)
+
+
+def bench_import_export(count: int) -> None:
+    """Measure the CSV and JSONL import and export throughput of a file with `count` rows."""
+    path = tempfile.mkdtemp(prefix="addressbook-bench-")
+    try:
+        csv_path = f"{path}/contacts.csv"
+        with open(csv_path, "w", encoding="utf-8", newline="") as file:
+            file.write("name,phones,birthday\n")
+            for name, phones, birthday in generate_contacts(count):
+                file.write(f"{name},{';'.join(phones)},{birthday.strftime('%d.%m.%Y')}\n")
+
+        for fmt in ("csv", "jsonl"):
+            book = AddressBook()
+            source = csv_path if fmt == "csv" else f"{path}/contacts.jsonl"
+            start = time.perf_counter()
+            with open(source, encoding="utf-8", newline="") as file:
+                errors = sum(1 for _ in book.import_stream(file, fmt))
+            elapsed = time.perf_counter() - start
+            print(f"import {fmt:5} {count / elapsed:12,.0f} rows/sec ({elapsed:.1f} s, {errors} errors)")
+
+            start = time.perf_counter()
+            with open(f"{path}/contacts.jsonl" if fmt == "csv" else f"{path}/export.jsonl", "w",
+                      encoding="utf-8", newline="") as file:
+                file.writelines(book.export_stream("jsonl"))
+            elapsed = time.perf_counter() - start
+            print(f"export jsonl {count / elapsed:12,.0f} rows/sec ({elapsed:.1f} s)")
+            del book
+    finally:
+        shutil.rmtree(path)
+
+
+def indexes_consistent(book: AddressBook) -> bool:
+    """Check that the phone and birthday indexes hold exactly the phones and birthdays of the records."""
+    pairs = 0
+    phones = book._phone_index()
+    for record in book.data.values():
+        for packed in record._phones:
+            owner = phones.get(packed)
+            if owner is not record and not (isinstance(owner, tuple) and record in owner):
+                return False
+            pairs += 1
+    indexed = sum(len(owner) if isinstance(owner, tuple) else 1 for owner in phones.values())
+    birthdays = sum(1 for record in book.data.values() if record._birthday)
+    return indexed == pairs and sum(len(bucket) for bucket in book._birthdays.values()) == birthdays
+
+
+def bench_concurrency(count: int, duration: float, write_share: float) -> None:
+    """
+    Run a mixed read/write load on a ConcurrentAddressBook from 1, 2, 4 and 8 threads, then check
+    that the phone and birthday indexes still match the records.
+    """
+    gil = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    source = build_book(count)
+
+    for threads in (1, 2, 4, 8):
+        book = ConcurrentAddressBook()
+        book._restore_records((name, record._phones, record._birthday) for name, record in source.items())
+        operations = [0] * threads
+        failures = []
+        stop = threading.Event()
+
+        def worker(number: int) -> None:
+            rnd = random.Random(number)
+            done = 0
+            try:
+                while not stop.is_set():
+                    record = book.find(f"user{rnd.randrange(count)}")
+                    if rnd.random() < write_share:
+                        choice = rnd.random()
+                        phone = f"{rnd.randrange(10**10):010d}"
+                        if choice < 0.4:
+                            record.add_phone(phone)
+                        elif choice < 0.8 and record.phones:
+                            record.edit_phone(record.phones[0].value, phone)
+                        else:
+                            record.add_birthday(f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.1990")
+                    else:
+                        choice = rnd.random()
+                        if choice < 0.45:
+                            book.find_by_phone(f"{rnd.randrange(10**10):010d}")
+                        elif choice < 0.9:
+                            str(record)
+                        else:
+                            book.get_upcoming_birthdays()
+                    done += 1
+            except Exception as e:
+                failures.append(repr(e))
+            operations[number] = done
+
+        workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        for thread in workers:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in workers:
+            thread.join()
+
+        consistent = indexes_consistent(book)
+        total = sum(operations)
+        print(f"{threads} threads: {total / duration:12,.0f} ops/sec, indexes consistent: {consistent}, "
+              f"errors: {len(failures)}")
+
+
+def bench_shards(count: int, max_shards: int, repeats: int) -> None:
+    """
+    Time the scatter/gather queries of a ShardedAddressBook with 1, 2, 4 ... `max_shards` worker processes
+    and check that they answer like a single AddressBook.
+    """
+    print(f"{os.cpu_count()} CPUs")
+    source = build_book(count)
+    today = date.today()
+    expected = source.get_upcoming_birthdays(30, today)
+    phones = [f"{random.Random(number).randrange(10**10):010d}" for number in range(repeats)]
+
+    shards = 1
+    while shards <= max_shards:
+        with ShardedAddressBook(shards) as book:
+            start = time.perf_counter()
+            book._restore_records((name, record._phones, record._birthday) for name, record in source.items())
+            load = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(repeats):
+                upcoming = book.get_upcoming_birthdays(30, today)
+            birthdays = (time.perf_counter() - start) / repeats
+
+            start = time.perf_counter()
+            for phone in phones:
+                book.find_by_phone(phone)
+            lookups = (time.perf_counter() - start) / repeats
+
+            start = time.perf_counter()
+            rendered = len(str(book))
+            render = time.perf_counter() - start
+
+        print(f"{shards:3} shards: load {load:6.1f} s, birthdays {birthdays * 1000:8.1f} ms, "
+              f"phone lookup {lookups * 1000:6.2f} ms, render {render:6.1f} s, "
+              f"same result: {upcoming == expected and rendered == len(str(source))}")
+        shards *= 2
+
+
+def scan_upcoming_birthdays(book: AddressBook, days: int, today: date) -> list[dict[str, str]]:
+    """The per-record loop get_upcoming_birthdays used before the birthday index, ordered like it is now."""
+    result = []
+    for record in book.data.values():
+        if record.birthday is None:
+            continue
+        birthday = record.birthday.value
+        try:
+            birthday_this_year = birthday.replace(year=today.year)
+        except ValueError:
+            birthday_this_year = date(today.year, 3, 1)
+        if birthday_this_year < today:
+            try:
+                birthday_this_year = birthday_this_year.replace(year=today.year + 1)
+            except ValueError:
+                birthday_this_year = date(today.year + 1, 3, 1)
+        if (birthday_this_year - today).days <= days:
+            iso_weekday = birthday_this_year.isoweekday()
+            if iso_weekday >= 6:
+                birthday_this_year += timedelta(days=8 - iso_weekday)
+            result.append((birthday_this_year, record.name.value))
+    result.sort()
+    return [{"name": name, "congratulation_date": day.strftime("%d.%m.%Y")} for day, name in result]
+
+
+def check_birthday_columns() -> int:
+    """
+    Check that BirthdayColumns answers like AddressBook.get_upcoming_birthdays on every day of 2023-2025
+    (leap and non-leap years, weekends, the year end), before and after the book changes.
+
+    Returns:
+        int: The number of mismatches, each one printed.
+    """
+    book = build_book(5_000)
+    book.add_record(Record("Leap"))
+    book.find("Leap").add_birthday("29.02.2000")
+    columns = BirthdayColumns(book)
+    mismatches = 0
+    for stage in ("on a fresh book", "after changes"):
+        if stage == "after changes":
+            # the columns must follow every kind of change of the book
+            names = list(book)
+            book.delete(names[0])
+            book.find(names[1]).add_birthday("01.03.1990")
+            record = Record("Newcomer")
+            record.add_birthday("28.02.1985")
+            book.add_record(record)
+            book.find(names[2]).add_phone("0123456789")
+            book.find(names[3]).add_birthday("29.02.1996")
+            book.undo()
+        day = date(2023, 1, 1)
+        while day < date(2026, 1, 1):
+            for days in (0, 7, 30, 365, 400):
+                if columns.get_upcoming_birthdays(days, day) != book.get_upcoming_birthdays(days, day):
+                    mismatches += 1
+                    print(f"birthday columns mismatch {stage}: {days} days from {day}")
+            day += timedelta(days=1)
+    return mismatches
+
+
+def bench_birthdays(count: int, repeats: int) -> int:
+    """
+    Check BirthdayColumns against the birthday index (see check_birthday_columns), then compare
+    their speed for a few window sizes. Returns the number of mismatches.
+    """
+    if np is None:
+        sys.exit("NumPy is not installed, the vectorized birthday engine cannot run.")
+    mismatches = check_birthday_columns()
+    print(f"differential check: {mismatches} mismatches")
+    if mismatches:
+        return mismatches
+
+    book = build_book(count)
+    start = time.perf_counter()
+    columns = BirthdayColumns(book)
+    print(f"columns built in {time.perf_counter() - start:.2f} s for {len(columns):,} birthdays")
+    today = date.today()
+    engines = {
+        "scan": lambda days: scan_upcoming_birthdays(book, days, today),
+        "index": lambda days: book.get_upcoming_birthdays(days, today),
+        "columns": lambda days: columns.get_upcoming_birthdays(days, today),
+    }
+    for days in (7, 30, 365):
+        timings = {}
+        for engine, upcoming in engines.items():
+            start = time.perf_counter()
+            for _ in range(repeats):
+                upcoming(days)
+            timings[engine] = (time.perf_counter() - start) / repeats
+        print(f"{days:3} days: " + ", ".join(f"{engine} {timing * 1000:8.1f} ms" for engine, timing in timings.items())
+              + f", columns vs scan {timings['scan'] / timings['columns']:5.1f}x")
+    return 0
+
+
+def bench_cache(count: int, repeats: int) -> None:
+    """
+    Time the cached read-only commands with the result cache off, on a cache hit, and on a miss right
+    after a write to the contact or the book they depend on.
+    """
+    from resultcache import ResultCache
+
+    book = build_book(count)
+    rnd = random.Random(0)
+    names = [f"user{rnd.randrange(count)}" for _ in range(100)]
+    commands = [("phone", (name,)) for name in names] + [("show-birthday", (name,)) for name in names]
+    commands += [("all", ("0", "100")), ("birthdays", ()), ("birthdays", ("30",))]
+    cache = ResultCache(len(commands))
+
+    def run(command: str, args) -> None:
+        for _ in write_lines(router.dispatch(command, args, book)):
+            pass
+
+    def time_per_call(calls) -> dict[str, float]:
+        timings = {}
+        for command, args in calls:
+            start = time.perf_counter_ns()
+            for _ in range(repeats):
+                run(command, args)
+            timings[command] = timings.get(command, 0) + (time.perf_counter_ns() - start) / repeats
+        counts = {command: sum(1 for name, _ in calls if name == command) for command in timings}
+        return {command: timings[command] / counts[command] / 1e3 for command in timings}
+
+    saved = router.cache
+    try:
+        router.cache = None
+        uncached = time_per_call(commands)
+        router.cache = cache
+        for command, args in commands:
+            run(command, args)
+        cached = time_per_call(commands)
+        # a write to every contact, then one lookup each: every entry misses once
+        for name in names:
+            book.find(name).add_phone("9999999999")
+        start = time.perf_counter_ns()
+        for command, args in commands:
+            run(command, args)
+        after_write = (time.perf_counter_ns() - start) / len(commands) / 1e3
+    finally:
+        router.cache = saved
+    print(f"{count:,} contacts, {len(commands)} distinct commands")
+    for command in uncached:
+        print(f"  {command:14} off {uncached[command]:10.2f} us   hit {cached[command]:8.2f} us   "
+              f"{uncached[command] / cached[command]:8.1f}x")
+    print(f"  miss after a write: {after_write:.2f} us/command on average")
+    print(f"  {cache.report()}")
+
+
+# Benchmark suite: every public operation of the model and every command, timed on books of several
+# sizes. A step prepares its arguments untimed, then runs one call per argument tuple; steps that change
+# the book are followed by steps undoing the change, so every repeat starts from the same book.
+class Step:
+    __slots__ = ("name", "prepare", "call", "items")
+
+    def __init__(self, name: str, prepare, call, items: int = 1):
+        self.name = name
+        self.prepare = prepare  # returns the list of argument tuples, one per call
+        self.call = call
+        self.items = items      # records or lines handled by one call, for the per-item rate
+
+
+def suite_steps(book: AddressBook, size: int, ops: int, seed: int = 0) -> list[Step]:
+    """The steps timed by the suite on a book of `size` generated contacts, `ops` calls for the cheap ones."""
+    rnd = random.Random(seed)
+    names = [f"user{rnd.randrange(size)}" for _ in range(ops)]
+    records = [book.find(name) for name in names]
+    # contacts may have no phones (--phones 0 N), the lookups of existing phones use those having some
+    owners = [record for record in records if record.phones]
+    phones = [record.phones[0].value for record in owners]
+    birthdays = [(record.birthday.value if record.birthday else date(1990, 1, 1)).strftime("%d.%m.%Y")
+                 for record in records]
+    fresh = [f"9{number:09d}" for number in range(ops)]
+    other = [f"8{number:09d}" for number in range(ops)]
+    # whole-book scans and fuzzy search are too slow to repeat `ops` times on big books
+    heavy = max(1, ops // 1000)
+    days = [date(2024, 1, 1) + timedelta(days=rnd.randrange(366)) for _ in range(heavy)]
+    import_lines = ["name,phones,birthday\n"]
+    import_lines += [f"bench{number},{fresh[number]},{birthdays[number]}\n" for number in range(ops)]
+
+    def same(values):
+        arguments = [(value,) for value in values]
+        return lambda: arguments
+
+    def dispatch(command: str):
+        return lambda *args: list(write_lines(router.dispatch(command, args, book)))
+
+    def new_records():
+        return [(Record(f"bench{number}"),) for number in range(ops)]
+
+    steps = [
+        Step("Name()", same(names), Name),
+        Step("Phone()", same(phones), Phone),
+        Step("Birthday()", same(birthdays), Birthday),
+        Step("Record.find_phone", lambda: list(zip(owners, phones)), Record.find_phone),
+        Step("Record.add_phone", lambda: list(zip(records, fresh)), Record.add_phone),
+        Step("Record.edit_phone", lambda: list(zip(records, fresh, other)) + list(zip(records, other, fresh)),
+             Record.edit_phone),
+        Step("Record.remove_phone", lambda: list(zip(records, fresh)), Record.remove_phone),
+        Step("Record.add_birthday", lambda: list(zip(records, birthdays)), Record.add_birthday),
+        Step("str(Record)", same(records), str),
+        Step("AddressBook.add_record", new_records, book.add_record),
+        Step("AddressBook.delete", lambda: [(f"bench{number}",) for number in range(ops)], book.delete),
+        Step("AddressBook.find", same(names), book.find),
+        Step("AddressBook.find_by_phone", same(phones), book.find_by_phone),
+        Step("AddressBook.search prefix", same(name[:6] for name in names), lambda prefix: book.search(prefix)),
+        # the first query builds the index of the fuzzy search, the engines without one scan the book
+        Step("AddressBook.search fuzzy", same(name[:-1] + "x" for name in names[:heavy]),
+             lambda query: book.search(fuzzy=query)),
+        Step("AddressBook.get_upcoming_birthdays 7", same(days), lambda today: book.get_upcoming_birthdays(7, today)),
+        Step("AddressBook.get_upcoming_birthdays 30", same(days), lambda today: book.get_upcoming_birthdays(30, today)),
+        Step("AddressBook.iter_lines", lambda: [(0, 1000)] * heavy,
+             lambda offset, limit: sum(1 for _ in book.iter_lines(offset, limit)), items=1000),
+        Step("AddressBook.export_stream", lambda: [("csv",)],
+             lambda fmt: sum(1 for _ in book.export_stream(fmt)), items=size),
+        Step("AddressBook.import_stream", lambda: [(import_lines,)],
+             lambda lines: sum(1 for _ in book.import_stream(lines)), items=ops),
+        Step("AddressBook.delete (imported)", lambda: [(f"bench{number}",) for number in range(ops)], book.delete),
+        Step("command add", lambda: [(f"bench{number}", fresh[number]) for number in range(ops)], dispatch("add")),
+        Step("command change", lambda: [(name, fresh[number], other[number]) for number, name in enumerate(names)]
+                                        + [(name, other[number], fresh[number]) for number, name in enumerate(names)],
+             dispatch("change")),
+        Step("command phone", same(names), dispatch("phone")),
+        Step("command find-phone", same(phones), dispatch("find-phone")),
+        Step("command search", same(name[:6] for name in names), dispatch("search")),
+        Step("command all 100", lambda: [("0", "100")] * heavy, dispatch("all"), items=100),
+        Step("command add-birthday", lambda: list(zip(names, birthdays)), dispatch("add-birthday")),
+        Step("command show-birthday", same(names), dispatch("show-birthday")),
+        Step("command birthdays", lambda: [()] * heavy, dispatch("birthdays")),
+        Step("command delete", lambda: [(f"bench{number}",) for number in range(ops)], dispatch("delete")),
+    ]
+    if not phones:
+        steps = [step for step in steps if step.name not in PHONE_LOOKUP_STEPS]
+    return steps
+
+
+# Steps looking up phones the book has, left out when no contact has a phone
+PHONE_LOOKUP_STEPS = {"Phone()", "Record.find_phone", "AddressBook.find_by_phone", "command find-phone"}
+
+
+def write_lines(reply):
+    """The lines of a command reply, consuming the streamed ones."""
+    return reply.split("\n") if isinstance(reply, str) else reply
+
+
+def run_suite(sizes: list[int], ops: int, repeats: int, contacts: dict, engine: str = "indexed") -> dict:
+    """
+    Time every suite step on books of the given sizes, best of `repeats`, and measure the memory of the books.
+
+    Returns:
+        dict: {"meta": run settings and platform, "results": {size: {"memory": ..., "operations": {step: ...}}}}
+    """
+    results = {}
+    for size in sizes:
+        gc.collect()
+        start = time.perf_counter()
+        book = build_book(size, engine, **contacts)
+        build = time.perf_counter() - start
+        retained, peak = measure_memory_peak(lambda: build_book(size, engine, **contacts))
+        steps = suite_steps(book, size, min(ops, size))
+        timings = {step.name: float("inf") for step in steps}
+        calls = {}
+        for _ in range(repeats):
+            for step in steps:
+                arguments = step.prepare()
+                call = step.call
+                gc.collect()
+                start = time.perf_counter_ns()
+                for args in arguments:
+                    call(*args)
+                elapsed = time.perf_counter_ns() - start
+                calls[step.name] = len(arguments)
+                timings[step.name] = min(timings[step.name], elapsed / len(arguments))
+
+        operations = {"AddressBook build": {"ns_per_op": build * 1e9 / size, "calls": size,
+                                            "items_per_sec": size / build}}
+        for step in steps:
+            ns = timings[step.name]
+            operations[step.name] = {"ns_per_op": ns, "calls": calls[step.name],
+                                     "items_per_sec": step.items * 1e9 / ns if ns else 0.0}
+        results[str(size)] = {
+            "memory": {"retained_bytes": retained, "peak_bytes": peak, "bytes_per_record": retained / size},
+            "operations": operations,
+        }
+        print(f"{size:,} contacts: built in {build:.2f} s, {retained / 2**20:.1f} MiB retained, "
+              f"{peak / 2**20:.1f} MiB peak", file=sys.stderr)
+        for name, result in operations.items():
+            print(f"  {name:38} {result['ns_per_op'] / 1000:12.2f} us/op {result['items_per_sec']:14,.0f} items/sec",
+                  file=sys.stderr)
+        del book, steps
+
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "ops": ops,
+            "repeats": repeats,
+            "contacts": contacts,
+            "engine": engine,
+        },
+        "results": results,
+    }
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float) -> int:
+    """
+    Print the operations that got slower or faster than in the baseline by more than `tolerance` (0.1 is 10%).
+
+    Returns:
+        int: The number of regressions.
+    """
+    regressions = 0
+    for size, result in current["results"].items():
+        before = baseline.get("results", {}).get(size)
+        if before is None:
+            continue
+        for name, timing in result["operations"].items():
+            old = before["operations"].get(name)
+            if old is None or not old["ns_per_op"]:
+                continue
+            ratio = timing["ns_per_op"] / old["ns_per_op"]
+            if ratio > 1 + tolerance:
+                regressions += 1
+                verdict = "SLOWER"
+            elif ratio < 1 - tolerance:
+                verdict = "faster"
+            else:
+                continue
+            print(f"{size:>9} {name:38} {old['ns_per_op'] / 1000:10.2f} -> {timing['ns_per_op'] / 1000:10.2f} us/op "
+                  f"{ratio:6.2f}x {verdict}")
+        old_memory, memory = before["memory"]["retained_bytes"], result["memory"]["retained_bytes"]
+        if old_memory and memory / old_memory > 1 + tolerance:
+            regressions += 1
+            print(f"{size:>9} memory {old_memory / 2**20:.1f} -> {memory / 2**20:.1f} MiB retained")
+    print(f"{regressions} regressions over {tolerance:.0%}")
+    return regressions
+
+
+def bench_suite(sizes: list[int], ops: int, repeats: int, output: str | None, baseline: str | None,
+                tolerance: float, contacts: dict, engine: str = "indexed") -> int:
+    """Run the suite, save its results as JSON and compare them with a baseline file. Returns the number of regressions."""
+    results = run_suite(sizes, ops, repeats, contacts, engine)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if baseline:
+        with open(baseline, encoding="utf-8") as file:
+            return compare_results(results, json.load(file), tolerance)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the address book.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    memory = subparsers.add_parser("memory", help="memory used by the record layouts")
+    memory.add_argument("-n", "--records", type=int, default=1_000_000)
+    parsing = subparsers.add_parser("parsing", help="birthday and phone validation speed")
+    parsing.add_argument("-n", "--records", type=int, default=1_000_000)
+    persistence = subparsers.add_parser("storage", help="snapshot and journal speed, startup load time")
+    persistence.add_argument("-n", "--records", type=int, default=1_000_000)
+    persistence.add_argument("-j", "--journal", type=int, default=100_000, help="journal entries to replay")
+    startup = subparsers.add_parser("startup", help="import time, time to the first prompt and reply, deferred indexes")
+    startup.add_argument("-n", "--records", type=int, default=1_000_000)
+    startup.add_argument("-r", "--repeats", type=int, default=3)
+    transfer = subparsers.add_parser("io", help="CSV/JSONL import and export throughput")
+    transfer.add_argument("-n", "--records", type=int, default=5_000_000)
+    concurrency = subparsers.add_parser("threads", help="ConcurrentAddressBook under a mixed multi-threaded load")
+    concurrency.add_argument("-n", "--records", type=int, default=100_000)
+    concurrency.add_argument("-d", "--duration", type=float, default=3.0, help="seconds per thread count")
+    concurrency.add_argument("-w", "--write-share", type=float, default=0.1)
+    sharding = subparsers.add_parser("shards", help="ShardedAddressBook scaling over worker processes")
+    sharding.add_argument("-n", "--records", type=int, default=10_000_000)
+    sharding.add_argument("-s", "--max-shards", type=int, default=os.cpu_count())
+    sharding.add_argument("-r", "--repeats", type=int, default=20)
+    birthdays = subparsers.add_parser("birthdays", help="vectorized birthday engine against the birthday index")
+    birthdays.add_argument("-n", "--records", type=int, default=1_000_000)
+    birthdays.add_argument("-r", "--repeats", type=int, default=5)
+    caching = subparsers.add_parser("cache", help="read-only commands with and without the result cache")
+    caching.add_argument("-n", "--records", type=int, default=1_000_000)
+    caching.add_argument("-r", "--repeats", type=int, default=100)
+    suite = subparsers.add_parser("suite", help="every public operation and command at several book sizes, saved as JSON")
+    suite.add_argument("-s", "--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    suite.add_argument("--ops", type=int, default=10_000, help="calls per cheap operation")
+    suite.add_argument("-r", "--repeats", type=int, default=3)
+    suite.add_argument("-o", "--output", help="file to save the results to as JSON")
+    suite.add_argument("-b", "--baseline", help="results of an earlier run to compare with")
+    suite.add_argument("-t", "--tolerance", type=float, default=0.1, help="allowed slowdown, 0.1 is 10%%")
+    suite.add_argument("--phones", type=int, nargs=2, default=(1, 2), metavar=("MIN", "MAX"))
+    suite.add_argument("--birthdays", choices=("uniform", "clustered", "none"), default="uniform")
+    suite.add_argument("--feb29-share", type=float, default=0.0)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--engine", choices=sorted(ENGINES), default="indexed", help="the address book engine to time")
+    args = parser.parse_args()
+
+    if args.benchmark == "memory":
+        bench_memory(args.records)
+    elif args.benchmark == "parsing":
+        bench_parsing(args.records)
+    elif args.benchmark == "storage":
+        bench_storage(args.records, args.journal)
+    elif args.benchmark == "startup":
+        bench_startup(args.records, args.repeats)
+    elif args.benchmark == "io":
+        bench_import_export(args.records)
+    elif args.benchmark == "threads":
+        bench_concurrency(args.records, args.duration, args.write_share)
+    elif args.benchmark == "shards":
+        bench_shards(args.records, args.max_shards, args.repeats)
+    elif args.benchmark == "birthdays":
+        if bench_birthdays(args.records, args.repeats):
+            sys.exit(1)
+    elif args.benchmark == "cache":
+        bench_cache(args.records, args.repeats)
+    elif args.benchmark == "suite":
+        contacts = {"seed": args.seed, "phones": tuple(args.phones), "birthdays": args.birthdays,
+                    "feb29_share": args.feb29_share}
+        if bench_suite(args.sizes, args.ops, args.repeats, args.output, args.baseline, args.tolerance, contacts,
+                       args.engine):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
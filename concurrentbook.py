@@ -0,0 +1,175 @@
+import threading
+from itertools import islice
+from types import MappingProxyType
+
+from contacts import AddressBook, Record
+
+
+class ConcurrentAddressBook(AddressBook):
+    """
+    AddressBook that can be shared between threads, including on free-threaded CPython builds.
+
+    Lookups (find, find_by_phone) take no lock: they are single dict reads. get_upcoming_birthdays copies
+    every birthday bucket it reads under the index lock, held for one small bucket at a time. Writers lock the stripe of the record they change, and the shared
+    indexes are updated under one short index lock, so writes to different records only meet there.
+    Iteration goes over an immutable snapshot. When the book changed since the last one, the next is a copy
+    of it with only the changed records copied again, so writers wait for those copies only.
+
+    Args:
+        stripes (int): Number of record locks; records are spread over them by name.
+    """
+
+    def __init__(self, *args, stripes: int = 64, **kwargs):
+        self._stripes = [threading.RLock() for _ in range(stripes)]
+        self._index_lock = threading.RLock()
+        self._version = 0
+        self._snapshot: MappingProxyType | None = None
+        self._snapshot_data: dict[str, Record] = {}
+        self._snapshot_version = -1
+        self._snapshot_lock = threading.Lock()
+        # names changed since the last snapshot -> True if the name left the book or is new in it, so that
+        # its place in the book order moved to the end; None when too much changed to track
+        self._changed: dict[str, bool] | None = {}
+        super().__init__(*args, **kwargs)
+
+    def _stripe(self, name: str) -> threading.RLock:
+        return self._stripes[hash(name) % len(self._stripes)]
+
+    def _record_lock(self, record: Record) -> threading.RLock:
+        return self._stripe(record.name.value)
+
+    # Writes: the stripe of the record first, then the index lock, always in this order
+    def __setitem__(self, name: str, record: Record) -> None:
+        with self._stripe(name), self._index_lock:
+            super().__setitem__(name, record)
+            self._version += 1
+
+    def __delitem__(self, name: str) -> None:
+        with self._stripe(name), self._index_lock:
+            super().__delitem__(name)
+            self._version += 1
+
+    def _restore_records(self, rows) -> None:
+        with self._index_lock:
+            super()._restore_records(rows)
+            self._version += 1
+            self._changed = None
+
+    # The changes are noted where the records are stored and in the record hooks, under the locks of the writer
+    def _note_change(self, name: str, moved: bool = False) -> None:
+        changed = self._changed
+        if changed is not None:
+            if moved:
+                changed[name] = True
+            else:
+                changed.setdefault(name, False)
+
+    def _store(self, name: str, record: Record) -> None:
+        self._note_change(name, name not in self.data)
+        super()._store(name, record)
+
+    def _unstore(self, name: str) -> None:
+        self._note_change(name, True)
+        super()._unstore(name)
+
+    def _phone_added(self, record: Record, packed: int) -> None:
+        with self._index_lock:
+            super()._phone_added(record, packed)
+            self._version += 1
+            self._note_change(record.name.value)
+
+    def _phone_removed(self, record: Record, packed: int) -> None:
+        with self._index_lock:
+            super()._phone_removed(record, packed)
+            self._version += 1
+            self._note_change(record.name.value)
+
+    def _phone_edited(self, record: Record, old_packed: int, new_packed: int) -> None:
+        with self._index_lock:
+            super()._phone_edited(record, old_packed, new_packed)
+            self._version += 1
+            self._note_change(record.name.value)
+
+    def _birthday_changed(self, record: Record, old_birthday) -> None:
+        with self._index_lock:
+            super()._birthday_changed(record, old_birthday)
+            self._version += 1
+            self._note_change(record.name.value)
+
+    # The deferred indexes are built under the index lock, find_by_phone only takes it while one is unfinished
+    def _build_phone_index(self, budget: int | None = None) -> bool:
+        with self._index_lock:
+            return super()._build_phone_index(budget)
+
+    def _build_name_index(self, budget: int | None = None) -> bool:
+        with self._index_lock:
+            return super()._build_name_index(budget)
+
+    # Reads
+    def _born_on(self, key: tuple[int, int]) -> tuple[str, ...]:
+        # iterating a bucket while a writer changes it is only safe under the GIL, the copy is made under the lock
+        with self._index_lock:
+            return tuple(self._birthdays.get(key, ()))
+
+    def search(self, *args, **kwargs) -> list[Record]:
+        # the name indexes are merged lazily by the queries themselves
+        with self._index_lock:
+            return super().search(*args, **kwargs)
+
+    def snapshot(self) -> MappingProxyType:
+        """
+        Read-only copy of the whole book, consistent across records: no write is half applied in it.
+        The copy is shared by all readers until the book changes.
+
+        Returns:
+            MappingProxyType[str, Record]: Detached copies of the records by name.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and self._snapshot_version == self._version:
+            return snapshot
+        with self._snapshot_lock:
+            if self._snapshot is not None and self._snapshot_version == self._version:
+                return self._snapshot
+            # the previous copies stay valid, copying the dict of them needs no lock of the writers
+            copies = self._snapshot_data.copy()
+            for stripe in self._stripes:
+                stripe.acquire()
+            try:
+                with self._index_lock:
+                    copies = self._apply_changes(copies)
+                    self._snapshot_data = copies
+                    self._snapshot = snapshot = MappingProxyType(copies)
+                    self._snapshot_version = self._version
+                    self._changed = {}
+            finally:
+                for stripe in reversed(self._stripes):
+                    stripe.release()
+        return snapshot
+
+    def _apply_changes(self, copies: dict[str, Record]) -> dict[str, Record]:
+        """Bring a copy of the previous snapshot up to date with the book, in the book order."""
+        data, changed = self.data, self._changed
+        if self._snapshot is None or changed is None or len(changed) > len(data) // 2:
+            return {name: Record._from_packed(name, record._phones, record._birthday) for name, record in data.items()}
+        # a name that left the book or is new in it now comes after all the others, as in the book
+        moved = 0
+        for name, left in changed.items():
+            if left:
+                copies.pop(name, None)
+                moved += name in data
+            elif name in data:
+                record = data[name]
+                copies[name] = Record._from_packed(name, record._phones, record._birthday)
+        for name in reversed(list(islice(reversed(data), moved))):
+            record = data[name]
+            copies[name] = Record._from_packed(name, record._phones, record._birthday)
+        return copies
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def items(self):
+        return self.snapshot().items()
+
+    def values(self):
+        return self.snapshot().values()
@@ -0,0 +1,26 @@
+"""
+The contacts model shared by the assistant bots: fields, records, the address book engines and
+the storage keeping a book on disk (contacts.storage).
+
+Every engine answers the same way (see contacts.conformance), they differ in memory and speed:
+
+- "dict"    DictAddressBook, records by name only, queries scan the book;
+- "indexed" AddressBook, indexes phones, birthdays and names, the default;
+- "compact" CompactAddressBook, contacts kept packed, queries scan the book.
+"""
+from .compactbook import CompactAddressBook
+from .dictbook import DictAddressBook, Transaction
+from .fields import Birthday, Field, Name, Phone, UserValueError
+from .indexedbook import AddressBook
+from .record import PhoneSet, Record
+
+ENGINES = {
+    "dict": DictAddressBook,
+    "indexed": AddressBook,
+    "compact": CompactAddressBook,
+}
+
+__all__ = [
+    "AddressBook", "Birthday", "CompactAddressBook", "DictAddressBook", "ENGINES", "Field", "Name",
+    "Phone", "PhoneSet", "Record", "Transaction", "UserValueError",
+]
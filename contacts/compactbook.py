@@ -0,0 +1,120 @@
+import sys
+from array import array
+from collections.abc import ItemsView, ValuesView
+
+from .dictbook import DictAddressBook
+from .fields import Birthday, Phone, _pack_phone
+from .record import Record
+
+
+# Class for the compact engine, which keeps contacts packed instead of as Record objects
+class CompactAddressBook(DictAddressBook):
+    """
+    The compact engine: every contact is kept as its packed phones (bytes) and birthday ordinal,
+    about a third of the memory of a Record with its array and Name. Records are built on access
+    and stay attached to the book, so changing them changes the stored contact; two records read
+    for the same contact share it. Queries scan the packed contacts like DictAddressBook does.
+    """
+
+    def __getitem__(self, name: str) -> Record:
+        phones, birthday_ordinal = self.data[name]
+        record = Record._from_packed(name, phones, birthday_ordinal)
+        record._book = self
+        return record
+
+    def find(self, name: str) -> Record | None:
+        """Find a Record by name. Returns None if not found."""
+        return self[name] if name in self.data else None
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def _store(self, name: str, record: Record) -> None:
+        self.data[name] = (record._phones.tobytes(), record._birthday)
+
+    def _unstore(self, name: str) -> None:
+        del self.data[name]
+
+    def _contact_version(self, name: str):
+        # every change stores a new row
+        return self.data.get(name)
+
+    def _state_of(self, name: str) -> tuple[bytes, int] | None:
+        return self.data.get(name)
+
+    def _rows(self):
+        for name, (phones, birthday_ordinal) in self.data.items():
+            yield name, array("Q", phones), birthday_ordinal
+
+    def find_by_phone(self, phone_number: str) -> Record | None:
+        """Find the Record owning a phone number. Returns None if not found."""
+        if not Phone.is_valid(phone_number):
+            return None
+        # a byte search over the packed phones, a match only counts at the start of a phone
+        needle = _pack_phone(phone_number).to_bytes(8, sys.byteorder)
+        for name, (phones, _) in self.data.items():
+            if needle in phones:
+                position = phones.find(needle)
+                while position != -1:
+                    if position % 8 == 0:
+                        return self[name]
+                    position = phones.find(needle, position + 1)
+        return None
+
+    def _restore_records(self, rows) -> None:
+        data, transaction = self.data, self._transaction
+        self._version += 1
+        for name, packed_phones, birthday_ordinal in rows:
+            name = sys.intern(name)
+            if transaction is not None:
+                transaction._touch(name)
+            data[name] = (array("Q", packed_phones).tobytes(), birthday_ordinal)
+            if birthday_ordinal and self._birthday_listeners:
+                self._notify_birthday(self[name])
+
+    # A record read earlier may be stale: its changes are applied to the stored contact as deltas,
+    # and dropped once the contact is gone
+    def _phone_added(self, record: Record, packed: int) -> None:
+        row = self.data.get(record.name.value)
+        if row is None:
+            return
+        phones = array("Q", row[0])
+        if packed not in phones:
+            phones.append(packed)
+            self.data[record.name.value] = (phones.tobytes(), row[1])
+        super()._phone_added(record, packed)
+
+    def _phone_removed(self, record: Record, packed: int) -> None:
+        row = self.data.get(record.name.value)
+        if row is None:
+            return
+        phones = array("Q", row[0])
+        if packed in phones:
+            phones.remove(packed)
+            self.data[record.name.value] = (phones.tobytes(), row[1])
+        super()._phone_removed(record, packed)
+
+    def _phone_edited(self, record: Record, old_packed: int, new_packed: int) -> None:
+        row = self.data.get(record.name.value)
+        if row is None:
+            return
+        phones = array("Q", row[0])
+        if old_packed in phones:
+            if new_packed in phones:
+                phones.remove(old_packed)
+            else:
+                phones[phones.index(old_packed)] = new_packed
+        elif new_packed not in phones:
+            phones.append(new_packed)
+        self.data[record.name.value] = (phones.tobytes(), row[1])
+        super()._phone_edited(record, old_packed, new_packed)
+
+    def _birthday_changed(self, record: Record, old_birthday: Birthday | None) -> None:
+        row = self.data.get(record.name.value)
+        if row is None:
+            return
+        self.data[record.name.value] = (row[0], record._birthday)
+        super()._birthday_changed(record, old_birthday)
@@ -0,0 +1,217 @@
+"""
+Conformance suite for the address book engines: the same random script of commands is run on every
+engine, and everything the books answer is compared with the plain DictAddressBook, which is the reference.
+
+    python -m contacts.conformance [--steps N] [--seed S] [--engine module:Class ...]
+
+Extra engines (e.g. concurrentbook:ConcurrentAddressBook) must take no constructor arguments.
+Exits with status 1 at the first difference, printing the step and what differed.
+"""
+import argparse
+import importlib
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from . import ENGINES, DictAddressBook, Record, UserValueError
+from .storage import Storage
+
+NAMES = ["Anna", "anna", "Andrew", "Andrii", "Bob", "Bohdan", "Carl", "Karl", "Olha", "Olga", "Oleh",
+         "Straße", "STRASSE", "Łukasz", "Zoë", "Jo", "Li"]
+
+
+def _random_phone(rng: random.Random) -> str:
+    # a small pool, so that numbers are often shared by several contacts
+    return f"{rng.randrange(40):010d}"
+
+
+def _random_birthday(rng: random.Random) -> str:
+    day = date(1970, 1, 1) + timedelta(days=rng.randrange(365 * 40))
+    if rng.random() < 0.1:
+        day = date(rng.choice((1988, 1992, 1996)), 2, 29)
+    return day.strftime("%d.%m.%Y")
+
+
+def _call(func, *args):
+    """The result of a call, or the type and message of the error it raised."""
+    try:
+        return func(*args)
+    except (UserValueError, ValueError, KeyError) as e:
+        return type(e).__name__, str(e)
+
+
+def _record_state(record: Record | None):
+    if record is None:
+        return None
+    birthday = record.birthday
+    return (record.name.value, [phone.value for phone in record.phones],
+            birthday.value.isoformat() if birthday else None, str(record))
+
+
+# One mutation of the script, applied the same way to every book
+def _mutate(book, rng: random.Random):
+    name = rng.choice(NAMES)
+    action = rng.randrange(12)
+    if action == 0:
+        record = Record(name)
+        for _ in range(rng.randrange(3)):
+            record.add_phone(_random_phone(rng))
+        if rng.random() < 0.5:
+            record.add_birthday(_random_birthday(rng))
+        book.add_record(record)
+        return "add_record", name
+    record = book.find(name)
+    if action == 1:
+        return "delete", book.delete(name)
+    if record is None:
+        record = Record(name)
+        book.add_record(record)
+    if action in (2, 3):
+        return "add_phone", _call(record.add_phone, rng.choice((_random_phone(rng), "12345")))
+    if action == 4:
+        return "remove_phone", _call(record.remove_phone, _random_phone(rng))
+    if action == 5:
+        phones = [phone.value for phone in record.phones] or [_random_phone(rng)]
+        return "edit_phone", _call(record.edit_phone, rng.choice(phones), _random_phone(rng))
+    if action == 6:
+        return "add_birthday", _call(record.add_birthday, rng.choice((_random_birthday(rng), "31.02.2000")))
+    if action == 7:
+        # many phones move the record past the PhoneSet threshold
+        for _ in range(rng.randrange(Record.PHONE_INDEX_THRESHOLD + 4)):
+            record.add_phone(f"{rng.randrange(10**10):010d}")
+        return "add_phones", len(record.phones)
+    if action == 8:
+        rows = ["name,phones,birthday"]
+        for _ in range(rng.randrange(1, 5)):
+            phones = ";".join(_random_phone(rng) for _ in range(rng.randrange(3)))
+            birthday = rng.choice(("", _random_birthday(rng), "99.99.1999"))
+            rows.append(f"{rng.choice(NAMES + [' '])},{phones},{birthday}")
+        return "import_stream", list(book.import_stream(rows, batch_size=2))
+    if action == 9:
+        rollback = rng.random() < 0.5
+        try:
+            with book.transaction():
+                _mutate(book, rng)
+                _mutate(book, rng)
+                if rollback:
+                    raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+        return "transaction", rollback
+    if action == 10:
+        return "undo", book.undo()
+    return "redo", book.redo()
+
+
+def _observe(book, rng: random.Random) -> dict:
+    """Everything a book answers about its contents, comparable between engines."""
+    observed = {
+        "len": len(book),
+        "records": [_record_state(record) for record in book.values()],
+        "names": list(book),
+        "lines": list(book.iter_lines(1, 5)),
+        "str": str(book),
+        "export": ["".join(book.export_stream("csv", batch_size=3)), "".join(book.export_stream("jsonl"))],
+        "prefix": [[record.name.value for record in book.search(prefix=prefix, limit=3)]
+                   for prefix in ("", "a", "ol", "STR", "Ł", "x")],
+        "fuzzy": [[record.name.value for record in book.search(fuzzy=query, max_distance=distance)]
+                  for query in ("ana", "olgha", "strasse", "Karl", "j") for distance in (1, 2)],
+    }
+    today = date(2024, 1, 1) + timedelta(days=rng.randrange(366))
+    observed["birthdays"] = [book.get_upcoming_birthdays(days, today) for days in (1, 7, 30)]
+    # shared numbers may report any of their owners, so the owner is checked rather than compared
+    owners = []
+    for number in range(40):
+        phone = f"{number:010d}"
+        owner = book.find_by_phone(phone)
+        holders = sorted(record.name.value for record in book.values() if record.find_phone(phone))
+        if (owner is None) != (not holders) or (owner is not None and owner.name.value not in holders):
+            raise AssertionError(f"find_by_phone({phone}) returned {_record_state(owner)}, holders are {holders}")
+        owners.append(holders)
+    observed["owners"] = owners
+    return observed
+
+
+def _differences(step: int, what: str, results: dict) -> list[str]:
+    """Describe how the results of every engine differ from those of the reference, field by field for states."""
+    found = []
+    reference = results["dict"]
+    for name, result in results.items():
+        if isinstance(result, dict):
+            found += [f"step {step}: {what} {key} of {name}: {result[key]!r:.300} != {reference[key]!r:.300}"
+                      for key in result if result[key] != reference[key]]
+        elif result != reference:
+            found.append(f"step {step}: {what} of {name}: {result!r:.300} != {reference!r:.300}")
+    return found
+
+
+def _load_engine(spec: str):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def run(engines: dict[str, type], steps: int = 2000, seed: int = 0) -> list[str]:
+    """
+    Run the script on every engine and compare them with DictAddressBook.
+
+    Args:
+        engines (dict[str, type]): Engine name -> book class.
+        steps (int): Number of mutations in the script.
+        seed (int): Seed of the script.
+    Returns:
+        list[str]: The differences found, empty when every engine conforms.
+    """
+    engines = {"dict": DictAddressBook, **{name: cls for name, cls in engines.items() if cls is not DictAddressBook}}
+    with tempfile.TemporaryDirectory() as directory:
+        books, storages, births = {}, {}, {}
+        for name, cls in engines.items():
+            books[name] = cls()
+            births[name] = []
+            books[name]._birthday_listeners.append(lambda record, seen=births[name]: seen.append(record.name.value))
+            storages[name] = Storage(os.path.join(directory, name), compact_every=50)
+            storages[name].load(books[name])
+
+        for step in range(steps):
+            results = {name: _mutate(book, random.Random(f"{seed}:{step}")) for name, book in books.items()}
+            found = _differences(step, "result", results)
+            if step % 25 == 0 or step == steps - 1 or found:
+                found += _differences(step, "state", {name: _observe(book, random.Random(f"{seed}:{step}"))
+                                                     for name, book in books.items()})
+                found += _differences(step, "birthday listeners", births)
+            if found:
+                return found
+
+        # every engine reloads what its storage wrote to the same contents
+        reloaded = {}
+        for name, cls in engines.items():
+            storages[name].close()
+            book = cls()
+            storage = Storage(os.path.join(directory, name))
+            storage.load(book)
+            storage.close()
+            reloaded[name] = [_record_state(record) for record in book.values()]
+        return _differences(steps, "reloaded records", reloaded)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Check that every address book engine behaves identically.")
+    parser.add_argument("--steps", type=int, default=2000, help="number of random mutations (default: 2000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random script (default: 0)")
+    parser.add_argument("--engine", action="append", default=[], metavar="MODULE:CLASS",
+                        help="an extra engine to check, can be repeated")
+    options = parser.parse_args(argv)
+
+    engines = dict(ENGINES)
+    for spec in options.engine:
+        engines[spec] = _load_engine(spec)
+    found = run(engines, options.steps, options.seed)
+    for difference in found:
+        print(difference)
+    print(f"{', '.join(engines)}: {'FAILED' if found else 'OK'} ({options.steps} steps, seed {options.seed})")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,595 @@
+import csv
+import heapq
+import io
+import json
+from array import array
+from collections import UserDict, deque
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from .fields import Birthday, Name, Phone, UserValueError, _pack_phone, _unpack_phone
+from .record import _NO_LOCK, Record
+
+# Same as calendar.isleap: importing calendar pulls in locale, which is most of the startup import time
+def _isleap(year: int) -> bool:
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+def _edit_distance(first: str, second: str, limit: int) -> int:
+    """Levenshtein distance between two strings, or limit + 1 as soon as it is known to exceed the limit."""
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+# Shared by every book implementation: walks the days of the window and asks the book who was born on each of them
+def _upcoming_birthdays(names_born_on, days: int, today: date | None) -> list[dict[str, str]]:
+    """
+    Build the upcoming birthdays list from a birthday index.
+
+    Args:
+        names_born_on (Callable[[tuple[int, int]], Iterable[str]]): Returns the names born on a (month, day).
+        days (int): Size of the window in days, today included.
+        today (date | None): The first day of the window (defaults to the current date).
+    Returns:
+        list[dict[str, str]]: See DictAddressBook.get_upcoming_birthdays.
+    """
+    today = today or datetime.today().date()
+    # names by congratulation date: weekend birthdays join the following Monday
+    congratulations: dict[date, list[str]] = {}
+    visited: set[tuple[int, int]] = set()
+
+    # every key comes up at least once in 367 days, Feb 29 included through March 1, so longer windows add nothing
+    for offset in range(min(days, 366) + 1):
+        birthday_date = today + timedelta(days=offset)
+        keys = [(birthday_date.month, birthday_date.day)]
+        if keys[0] == (3, 1) and not _isleap(birthday_date.year):
+            # If it was February 29 and the year is not a leap year, we celebrate March 1
+            keys.append((2, 29))
+
+        names: list[str] = []
+        for key in keys:
+            if key not in visited:
+                visited.add(key)
+                names.extend(names_born_on(key))
+        if not names:
+            continue
+
+        iso_weekday = birthday_date.isoweekday()
+        if iso_weekday >= 6: # Saturday or Sunday
+            congratulation_date = birthday_date + timedelta(days= 8 - iso_weekday)
+        else:
+            congratulation_date = birthday_date
+        congratulations.setdefault(congratulation_date, []).extend(names)
+
+    result: list[dict[str, str]] = []
+    for congratulation_date, names in congratulations.items():
+        congratulation = congratulation_date.strftime("%d.%m.%Y")
+        for name in sorted(names):
+            result.append({"name": name, "congratulation_date": congratulation})
+    return result
+
+# A batch of changes to a book, see DictAddressBook.transaction
+class Transaction:
+    """
+    Delta log of a transaction: the state each contact had before the transaction first changed it,
+    as packed phone bytes and a birthday ordinal, or None for a contact that did not exist. Nothing else
+    is copied, so a transaction costs memory in proportion to the contacts it changes, not to the book.
+
+    Used as a context manager it commits when the block ends and rolls back when the block raises.
+    A transaction opened inside another one is a savepoint: its rollback undoes only its own changes,
+    and its commit hands them over to the outer transaction, which alone enters the undo history.
+    """
+
+    __slots__ = ("book", "_before", "_parent")
+
+    def __init__(self, book: "DictAddressBook"):
+        self.book = book
+        self._before: dict[str, tuple[bytes, int] | None] = {}
+        self._parent = book._transaction
+        book._transaction = self
+
+    def __enter__(self) -> "Transaction":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.book._transaction is self:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+
+    def __len__(self) -> int:
+        """The number of contacts changed so far."""
+        return len(self._before)
+
+    def _touch(self, name: str) -> None:
+        if name not in self._before:
+            self._before[name] = self.book._state_of(name)
+
+    def _end(self) -> None:
+        if self.book._transaction is not self:
+            raise RuntimeError("Only the innermost open transaction can be committed or rolled back.")
+        self.book._transaction = self._parent
+
+    def commit(self) -> None:
+        """Keep the changes and make them one step of the undo history."""
+        self._end()
+        if self._parent is not None:
+            outer = self._parent._before
+            for name, state in self._before.items():
+                outer.setdefault(name, state)
+        elif self._before:
+            self.book._remember(self._before)
+
+    def rollback(self) -> None:
+        """Put every contact changed by the transaction back as it was when the transaction began."""
+        self._end()
+        # the outer transaction already saved these contacts, or they come back as they were when it began
+        self.book._transaction = None
+        try:
+            self.book._apply_states(self._before)
+        finally:
+            self.book._transaction = self._parent
+
+
+# The plain engine, and the base of the others
+class DictAddressBook(UserDict):
+    """
+    Address book keeping its records in a plain dict by name, with no index: the lookups by phone,
+    birthday and name scan the records. It needs the least memory and the least work per change,
+    and suits small books. It is also the base of the other engines, which keep its interface and
+    answer exactly like it (see contacts.conformance):
+
+    - AddressBook indexes phones, birthdays and names, so its lookups do not depend on the book size;
+    - CompactAddressBook keeps every contact packed, without Record objects, for large books kept in memory.
+
+    Engines share transactions with undo/redo, import/export, listings and the storage hooks.
+    Scanning queries go through _rows(), and records are read through find() and values(),
+    so an engine only has to override how it stores and indexes the contacts.
+    """
+
+    # bounds of the undo history: the number of steps, and the number of contact states they keep in total
+    UNDO_STEPS = 100
+    UNDO_STATES = 1_000_000
+
+    def __init__(self, *args, **kwargs):
+        # persistent storage receiving every mutation, see storage.Storage
+        self._journal = None
+        # callables told about every record whose birthday was set or added, see scheduler.BirthdayScheduler
+        self._birthday_listeners: list = []
+        # the innermost open transaction, and the before states of the committed ones, newest last
+        self._transaction: Transaction | None = None
+        self._undo: deque[dict[str, tuple[bytes, int] | None]] = deque()
+        self._undo_states = 0
+        self._redo: list[dict[str, tuple[bytes, int] | None]] = []
+        # bumped by every change of the book, so cached replies about the whole book can tell they are stale
+        self._version = 0
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, name: str, record: Record) -> None:
+        if self._transaction is not None:
+            self._transaction._touch(name)
+        self._version += 1
+        self._store(name, record)
+        self._attach(record)
+        if self._journal is not None:
+            birthday = record.birthday
+            self._journal.log("R", name, ";".join(_unpack_phone(packed) for packed in record._phones),
+                              birthday.value.strftime("%d.%m.%Y") if birthday else "")
+
+    def __delitem__(self, name: str) -> None:
+        if self._transaction is not None:
+            self._transaction._touch(name)
+        self._version += 1
+        self._unstore(name)
+        if self._journal is not None:
+            self._journal.log("D", name)
+
+    def _store(self, name: str, record: Record) -> None:
+        """Keep a record under its name, in place of the one there."""
+        previous = self.data.get(name)
+        if previous is not None:
+            self._detach(previous)
+        self.data[name] = record
+
+    def _unstore(self, name: str) -> None:
+        self._detach(self.data.pop(name))
+
+    def _attach(self, record: Record) -> None:
+        """Make a record just stored in the book part of it: the indexes of the engine and the listeners."""
+        record._book = self
+        if record._birthday:
+            self._notify_birthday(record)
+
+    def _detach(self, record: Record) -> None:
+        """Undo _attach for a record leaving the book."""
+        record._book = None
+
+    def _notify_birthday(self, record: Record) -> None:
+        for listener in self._birthday_listeners:
+            listener(record)
+
+    def _restore_record(self, name: str, packed_phones, birthday_ordinal: int) -> Record:
+        """Add a record from its packed form without validating it again. Used by the storage loaders."""
+        record = Record._from_packed(name, packed_phones, birthday_ordinal)
+        if self._transaction is not None:
+            self._transaction._touch(record.name.value)
+        self._version += 1
+        self._store(record.name.value, record)
+        self._attach(record)
+        return record
+
+    def _restore_records(self, rows) -> None:
+        """
+        Bulk version of _restore_record for loading a whole book.
+
+        Args:
+            rows (Iterable[tuple[str, Sequence[int], int]]): Name, packed phones and birthday ordinal of each record.
+        """
+        for name, packed_phones, birthday_ordinal in rows:
+            self._restore_record(name, packed_phones, birthday_ordinal)
+
+    def _rows(self):
+        """Yield the name, packed phones and birthday ordinal (0 - not set) of every contact, in book order."""
+        for name, record in self.data.items():
+            yield name, record._phones, record._birthday
+
+    def transaction(self) -> Transaction:
+        """
+        Open a transaction: the changes made until it ends can be rolled back at once, and once committed
+        they are undone and redone as one step. Use it as `with book.transaction():`, or call commit()
+        or rollback() on it. Contacts put back by a rollback, undo or redo are new Record objects.
+        A transaction belongs to the book, so on a ConcurrentAddressBook it also takes in the changes
+        other threads make while it is open.
+
+        Returns:
+            Transaction: The new transaction, nested in the one already open if there is one.
+        """
+        return Transaction(self)
+
+    def undo(self) -> bool:
+        """Revert the last committed transaction. Returns False if there is nothing to undo."""
+        self._check_no_transaction()
+        if not self._undo:
+            return False
+        before = self._undo.pop()
+        self._undo_states -= len(before)
+        self._redo.append(self._apply_states(before))
+        return True
+
+    def redo(self) -> bool:
+        """Apply again the last undone transaction. Returns False if there is nothing to redo."""
+        self._check_no_transaction()
+        if not self._redo:
+            return False
+        self._push_undo(self._apply_states(self._redo.pop()))
+        return True
+
+    def _check_no_transaction(self) -> None:
+        if self._transaction is not None:
+            raise RuntimeError("Cannot undo or redo while a transaction is open.")
+
+    def _remember(self, before: dict[str, tuple[bytes, int] | None]) -> None:
+        """Add a committed transaction to the undo history; it replaces whatever could be redone."""
+        self._redo.clear()
+        self._push_undo(before)
+
+    def _push_undo(self, before: dict[str, tuple[bytes, int] | None]) -> None:
+        self._undo.append(before)
+        self._undo_states += len(before)
+        # the oldest steps go first, the newest one stays even when it is larger than the bound alone
+        while len(self._undo) > self.UNDO_STEPS or (self._undo_states > self.UNDO_STATES and len(self._undo) > 1):
+            self._undo_states -= len(self._undo.popleft())
+
+    def _contact_version(self, name: str):
+        """A value that changes whenever the contact changes, is added or removed; compared with ==."""
+        record = self.data.get(name)
+        return None if record is None else (record, record._version)
+
+    def _state_of(self, name: str) -> tuple[bytes, int] | None:
+        """The packed phones and the birthday ordinal of a contact, None if there is no such contact."""
+        record = self.data.get(name)
+        return None if record is None else (record._phones.tobytes(), record._birthday)
+
+    def _apply_states(self, states: dict[str, tuple[bytes, int] | None]) -> dict[str, tuple[bytes, int] | None]:
+        """
+        Bring contacts to the given states, through the usual mutations so that the journal follows.
+
+        Args:
+            states (dict[str, tuple[bytes, int] | None]): Name -> state, see _state_of.
+        Returns:
+            dict[str, tuple[bytes, int] | None]: The states the contacts had before, to go back to them.
+        """
+        previous = {}
+        for name, state in states.items():
+            current = previous[name] = self._state_of(name)
+            if current == state:
+                continue
+            if state is None:
+                del self[name]
+            else:
+                phones, birthday = state
+                self[name] = Record._from_packed(name, array("Q", phones), birthday)
+        return previous
+
+    def _record_lock(self, record: Record):
+        """Lock a Record takes before changing itself. A plain book is not shared between threads."""
+        return _NO_LOCK
+
+    def items(self):
+        return self.data.items()
+
+    def values(self):
+        return self.data.values()
+
+    # Notifications sent by a Record after it changed, they keep the journal (and the indexes of an engine) in sync
+    def _phone_added(self, record: Record, packed: int) -> None:
+        self._version += 1
+        if self._journal is not None:
+            self._journal.log("P", record.name.value, _unpack_phone(packed))
+
+    def _phone_removed(self, record: Record, packed: int) -> None:
+        self._version += 1
+        if self._journal is not None:
+            self._journal.log("X", record.name.value, _unpack_phone(packed))
+
+    def _phone_edited(self, record: Record, old_packed: int, new_packed: int) -> None:
+        self._version += 1
+        if self._journal is not None:
+            self._journal.log("E", record.name.value, _unpack_phone(old_packed), _unpack_phone(new_packed))
+
+    def _birthday_changed(self, record: Record, old_birthday: Birthday | None) -> None:
+        self._version += 1
+        self._notify_birthday(record)
+        if self._journal is not None:
+            self._journal.log("B", record.name.value, record.birthday.value.strftime("%d.%m.%Y"))
+
+    def add_record(self, record: Record):
+        """Adds a Record to the address book. If a record with the same name exists, it overwrites it."""
+        self[record.name.value] = record
+
+    def find(self, name: str) -> Record | None:
+        """Find a Record by name. Returns None if not found."""
+        return self.data.get(name)
+
+    def find_by_phone(self, phone_number: str) -> Record | None:
+        """Find the Record owning a phone number. Returns None if not found."""
+        if not Phone.is_valid(phone_number):
+            return None
+        packed = _pack_phone(phone_number)
+        for name, phones, _ in self._rows():
+            if packed in phones:
+                return self.find(name)
+        return None
+
+    def delete(self, name: str)-> bool:
+        """Delete a Record by name."""
+        if name in self.data:
+            del self[name]
+            return True
+        else:
+            return False
+
+    def build_indexes(self, budget: int | None = None) -> bool:
+        """
+        Build the indexes an engine left for later a step at a time, see AddressBook.build_indexes.
+        This engine has none.
+
+        Returns:
+            bool: True once every index is complete.
+        """
+        return True
+
+    def search(self, prefix: str | None = None, fuzzy: str | None = None, limit: int = 10,
+               max_distance: int = 1) -> list[Record]:
+        """
+        Search contacts by the beginning of their name or by a misspelled name, ignoring case.
+
+        Args:
+            prefix (str | None): Return the names starting with it, in alphabetical order.
+            fuzzy (str | None): Return the names at most `max_distance` edits (Levenshtein) away from it,
+                                closest first. Used when `prefix` is not given.
+            limit (int): The maximum number of records returned.
+            max_distance (int): The largest edit distance accepted by a fuzzy search. AddressBook answers
+                                up to 1 from an index, larger distances compare many more names.
+        Returns:
+            list[Record]: The matching records.
+        """
+        if prefix is not None:
+            names = self._search_prefix(prefix.casefold(), limit)
+        elif fuzzy is not None:
+            names = self._search_fuzzy(fuzzy.casefold(), limit, max_distance)
+        else:
+            raise ValueError("Give a prefix or a fuzzy name to search for.")
+        return [self.find(name) for name in names]
+
+    def _search_prefix(self, prefix: str, limit: int) -> list[str]:
+        keys = ((name.casefold(), name) for name in self.data)
+        return [name for _, name in heapq.nsmallest(limit, (key for key in keys if key[0].startswith(prefix)))]
+
+    def _search_fuzzy(self, query: str, limit: int, max_distance: int) -> list[str]:
+        matches = []
+        for name in self.data:
+            distance = _edit_distance(query, name.casefold(), max_distance)
+            if distance <= max_distance:
+                matches.append((distance, name))
+        return [name for _, name in heapq.nsmallest(limit, matches)]
+
+    def import_stream(self, lines, fmt: str = "csv", batch_size: int = 1000):
+        """
+        Import contacts from CSV or JSONL text, merging them into the book like the add command does:
+        a new name creates a contact, a known one gets the new phones, and a given birthday replaces the old one.
+        Lines are consumed lazily and processed in batches, so the memory used does not depend on the input size.
+        A bad row is skipped as a whole and reported, the rest of the batch is still imported.
+
+        CSV input starts with a "name,phones,birthday" header, phones are separated by ";".
+        JSONL rows look like {"name": "John", "phones": ["1234567890"], "birthday": "12.07.1990"}.
+
+        Args:
+            lines (Iterable[str]): The input, e.g. an open text file.
+            fmt (str): "csv" or "jsonl".
+            batch_size (int): Number of rows validated before they are applied.
+        Yields:
+            tuple[int, str]: The row number (1-based, the CSV header excluded) and the error of each rejected row.
+        """
+        rows = self._read_rows(lines, fmt)
+        number = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            valid = []
+            for row in batch:
+                number += 1
+                try:
+                    valid.append(self._validate_row(row, fmt))
+                except UserValueError as e:
+                    yield number, str(e)
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    yield number, f"Malformed row: {row!r}"
+            self._merge_rows(valid)
+
+    def _merge_rows(self, rows) -> None:
+        """Merge validated (name, packed phones, birthday ordinal) rows into the book, see import_stream."""
+        for name, phones, birthday in rows:
+            record = self.find(name)
+            if record is None:
+                # a new contact is built complete, so it is indexed and journaled once
+                self.add_record(Record._from_packed(name, dict.fromkeys(phones), birthday))
+                continue
+            for packed in phones:
+                record._add_packed(packed)
+            if birthday:
+                record._set_birthday(birthday)
+
+    @staticmethod
+    def _read_rows(lines, fmt: str):
+        """Yield the raw rows of the input: lists of CSV fields or JSONL lines."""
+        if fmt == "csv":
+            reader = csv.reader(lines)
+            header = next(reader, None)
+            if header is not None and [column.strip().lower() for column in header] != ["name", "phones", "birthday"]:
+                raise ValueError("CSV input must start with a name,phones,birthday header.")
+            for row in reader:
+                if row:
+                    yield row
+        elif fmt == "jsonl":
+            for line in lines:
+                if line.strip():
+                    yield line
+        else:
+            raise ValueError(f"Unknown format {fmt}, use csv or jsonl.")
+
+    @staticmethod
+    def _validate_row(row, fmt: str) -> tuple[str, list[int], int]:
+        """Validate a raw row and return its name, packed phones and birthday ordinal (0 - not given)."""
+        return DictAddressBook._validate_fields(*DictAddressBook._split_row(row, fmt))
+
+    @staticmethod
+    def _split_row(row, fmt: str) -> tuple[str, list[str], str]:
+        """Split a raw row into its name, phones and birthday, as written in the input."""
+        if fmt == "csv":
+            name, phones, birthday = row
+            return name, [phone for phone in phones.split(";") if phone], birthday
+        fields = json.loads(row)
+        name, phones, birthday = fields["name"], fields.get("phones") or [], fields.get("birthday") or ""
+        if not isinstance(phones, list):
+            raise TypeError("phones must be a list")
+        return name, phones, birthday
+
+    @staticmethod
+    def _validate_fields(name: str, phones: list[str], birthday: str) -> tuple[str, list[int], int]:
+        name = Name(name).value
+        packed = []
+        for phone in phones:
+            phone = phone.strip()
+            if not Phone.is_valid(phone):
+                raise UserValueError(f"Invalid phone number {phone}. It must be a string of exactly 10 digits.")
+            packed.append(_pack_phone(phone))
+        ordinal = 0
+        if birthday and birthday.strip():
+            birthday_date = Birthday.try_parse(birthday.strip())
+            if birthday_date is None:
+                raise UserValueError(f"Invalid birthday {birthday}. Use DD.MM.YYYY")
+            ordinal = birthday_date.toordinal()
+        return name, packed, ordinal
+
+    def export_stream(self, fmt: str = "csv", batch_size: int = 1000):
+        """
+        Export the book as CSV or JSONL text in the format read by import_stream.
+
+        Args:
+            fmt (str): "csv" or "jsonl".
+            batch_size (int): Number of rows put in one chunk.
+        Yields:
+            str: Chunks of complete lines, ready for file.writelines.
+        """
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown format {fmt}, use csv or jsonl.")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if fmt == "csv":
+            writer.writerow(("name", "phones", "birthday"))
+        for count, (name, packed_phones, ordinal) in enumerate(self._rows(), 1):
+            phones = [_unpack_phone(packed) for packed in packed_phones]
+            birthday = date.fromordinal(ordinal).strftime("%d.%m.%Y") if ordinal else ""
+            if fmt == "csv":
+                writer.writerow((name, ";".join(phones), birthday))
+            else:
+                buffer.write(json.dumps({"name": name, "phones": phones, "birthday": birthday}, ensure_ascii=False))
+                buffer.write("\n")
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    # Function to get upcoming birthdays within the next `days` days
+    def get_upcoming_birthdays(self, days: int = 7, today: date | None = None) -> list[dict[str,str]]:
+        """
+        Function return a list of users whose birthdays occur within the next `days` days,
+        adjusting for leap-year dates and weekend celebrations.
+        This engine scans every contact; AddressBook only visits the birthday buckets inside the window.
+
+        Args:
+            days (int): Size of the window in days, today included (defaults to 7).
+            today (date | None): The first day of the window (defaults to the current date).
+        Returns:
+            list[dict[str, str]]: A list of dictionaries, each with "name" and "congratulation_date" (DD.MM.YYYY)
+                                for birthdays falling within the window, ordered by congratulation date and name.
+                                Weekend birthdays are shifted to the following Monday.
+                                Feb 29 birthdays in non-leap years are shifted to March 1.
+        """
+        born: dict[tuple[int, int], list[str]] = {}
+        for name, _, ordinal in self._rows():
+            if ordinal:
+                birthday = date.fromordinal(ordinal)
+                born.setdefault((birthday.month, birthday.day), []).append(name)
+        return _upcoming_birthdays(lambda key: born.get(key, ()), days, today)
+
+    def iter_lines(self, offset: int = 0, limit: int | None = None):
+        """
+        Render the records one line at a time, so a listing can be written out while it is produced.
+
+        Args:
+            offset (int): The number of records to skip.
+            limit (int | None): The most records to render, all of them by default.
+        Yields:
+            str: The text of one record.
+        """
+        stop = None if limit is None else offset + limit
+        for record in islice(self.values(), offset, stop):
+            yield str(record)
+
+    def __str__(self):
+        if not self:
+            return "Address book is empty."
+        return "\n".join(self.iter_lines())
@@ -0,0 +1,101 @@
+import sys
+from datetime import date, datetime
+
+class UserValueError(ValueError):
+    pass
+
+# Basic class for fields in the address book
+class Field:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return str(self.value)
+
+# Class for names with validation
+class Name(Field):
+    __slots__ = ()
+
+    def __init__(self, value: str):
+        #validate name: must be a non-empty string
+        if not isinstance(value, str) or not value.strip():
+            raise UserValueError("The name must be a non-empty string.")
+        # names are used as dict keys in every index, so share one string object between them
+        super().__init__(sys.intern(value.strip()))
+
+
+# Class for phone numbers with validation
+class Phone(Field):
+    __slots__ = ()
+
+    def __init__(self, value:str):
+        # vakidate phone number: must be a string of 10 digits
+        if not Phone.is_valid(value):
+            raise UserValueError("The phone number must be a string of exactly 10 digits.")
+        super().__init__(value)
+
+    @staticmethod
+    def is_valid(value) -> bool:
+        """Check a phone number without raising: it must be a string of exactly 10 ascii digits."""
+        return isinstance(value, str) and len(value) == 10 and value.isdigit() and value.isascii()
+
+    @classmethod
+    def _from_packed(cls, packed: int) -> "Phone":
+        """Build a Phone from its packed form without validating it again."""
+        phone = cls.__new__(cls)
+        phone.value = _unpack_phone(packed)
+        return phone
+
+# Class for birthdays with validation and save as a date object
+class Birthday(Field):
+    __slots__ = ()
+
+    def __init__(self, value:str):
+        if not isinstance(value, str):
+            raise UserValueError("Birthday must be a string in the format DD.MM.YYYY")
+        date_input = Birthday.try_parse(value)
+        if date_input is None:
+            raise UserValueError("Invalid date format. Use DD.MM.YYYY")
+        super().__init__(date_input)
+
+    @staticmethod
+    def try_parse(value) -> date | None:
+        """
+        Parse a DD.MM.YYYY string without raising.
+        The fixed-width format is sliced directly, strptime is only used for the other
+        spellings it accepts (like 1.2.1990), so both paths accept the same input.
+
+        Args:
+            value (str): The birthday string.
+        Returns:
+            date | None: The parsed date, or None if the value is not a valid date.
+        """
+        if not isinstance(value, str):
+            return None
+        if len(value) == 10 and value[2] == "." and value[5] == "." and value.isascii():
+            day, month, year = value[:2], value[3:5], value[6:]
+            if day.isdigit() and month.isdigit() and year.isdigit():
+                try:
+                    return date(int(year), int(month), int(day))
+                except ValueError:
+                    return None
+        try:
+            return datetime.strptime(value, "%d.%m.%Y").date()
+        except ValueError:
+            return None
+
+    @classmethod
+    def _from_ordinal(cls, ordinal: int) -> "Birthday":
+        """Build a Birthday from its packed form (a date ordinal) without parsing it again."""
+        birthday = cls.__new__(cls)
+        birthday.value = date.fromordinal(ordinal)
+        return birthday
+
+# Phones are stored packed as 64-bit ints; a valid phone always has exactly 10 digits
+def _pack_phone(phone_number: str) -> int:
+    return int(phone_number)
+
+def _unpack_phone(packed: int) -> str:
+    return f"{packed:010d}"
@@ -0,0 +1,439 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import date
+from operator import itemgetter
+
+from .dictbook import DictAddressBook, _edit_distance, _upcoming_birthdays
+from .fields import Birthday, Phone, _pack_phone
+from .record import Record
+
+
+# Sorting by name and then stably by casefolded name gives the order of the (casefolded name, name) pairs,
+# and compares plain strings, which is much faster than comparing the pairs
+def _sorted_name_keys(keys) -> list[tuple[str, str]]:
+    keys = sorted(keys, key=itemgetter(1))
+    keys.sort(key=itemgetter(0))
+    return keys
+
+# Trigrams of a name padded with boundary marks, so that short names and name edges are indexed too
+def _trigrams(name: str) -> set[str]:
+    padded = f"  {name.casefold()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Fuzzy queries within one edit use a deletion neighbourhood, as in SymSpell: a name and a query at most one edit
+# apart share a key, the casefolded string itself or the string with one character deleted. Keys are kept
+# hashed to 32 bits, a collision only adds a candidate that the edit distance check then drops.
+_HASH_MASK = (1 << 32) - 1
+
+def _deletion_keys(folded: str) -> set[int]:
+    return {hash(key) & _HASH_MASK for key in (folded, *[folded[:i] + folded[i + 1:] for i in range(len(folded))])}
+
+# The edit distance of two strings when it is 0 or 1, else 2: the strings must be equal past their first difference
+def _near_distance(first: str, second: str) -> int:
+    if first == second:
+        return 0
+    if len(first) > len(second):
+        first, second = second, first
+    if len(second) - len(first) > 1:
+        return 2
+    i = 0
+    while i < len(first) and first[i] == second[i]:
+        i += 1
+    rest = first[i + 1:] if len(first) == len(second) else first[i:]
+    return 1 if rest == second[i + 1:] else 2
+
+
+# Class for the address book, which holds multiple records
+class AddressBook(DictAddressBook):
+    """
+    The indexed engine: on top of the records by name it keeps the owners of every phone number,
+    the records by birthday day and two name indexes, so lookups do not scan the book.
+    The default engine of the assistant bot.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # birthday index: (month, day) -> records born that day, kept in sync on every mutation
+        self._birthdays: dict[tuple[int, int], dict[str, Record]] = {}
+        # callables told the name of every record entering or leaving the birthday index,
+        # see vectorbirthdays.BirthdayColumns
+        self._birthday_index_listeners: list = []
+        # reverse phone index: packed phone number -> the record owning it,
+        # or a tuple of records for the rare numbers shared by several contacts;
+        # built on the first phone lookup, see _build_phone_index
+        self._phones: dict[int, Record | tuple[Record, ...]] | None = None
+        self._phone_backlog: deque[Record] = deque()
+        # name search: (casefolded name, name) pairs kept sorted for prefix queries; names added since the
+        # last query wait in a set and are merged in by the next query; built on the first prefix query
+        self._sorted_names: list[tuple[str, str]] | None = None
+        self._pending_names: set[tuple[str, str]] = set()
+        self._name_backlog: deque[str] = deque()
+        # fuzzy queries within one edit: the names by id, and the deletion keys of their casefolded forms
+        # as a sorted array of key << 32 | id; names added since it was sorted wait in a dict, removed ones
+        # stay until the next rebuild and are skipped by the queries; built on the first such query
+        self._near_names: list[str] | None = None
+        self._near_keys = array("Q")
+        self._near_pending: dict[int, list[int]] = {}
+        self._near_pending_count = 0
+        self._near_removed = 0
+        # trigram -> names containing it, for fuzzy queries of more edits; built on the first of them
+        self._trigrams: dict[str, set[str]] | None = None
+        super().__init__(*args, **kwargs)
+
+    def _attach(self, record: Record) -> None:
+        self._index_record(record)
+        super()._attach(record)
+
+    def _detach(self, record: Record) -> None:
+        self._unindex_record(record)
+        super()._detach(record)
+
+    def _restore_records(self, rows) -> None:
+        """
+        Bulk version of _restore_record for loading a whole book: the index updates are inlined
+        because this loop runs once per contact at startup.
+
+        Args:
+            rows (Iterable[tuple[str, Sequence[int], int]]): Name, packed phones and birthday ordinal of each record.
+        """
+        data, phones_index, birthdays = self.data, self._phones, self._birthdays
+        from_packed, fromordinal, listeners = Record._from_packed, date.fromordinal, self._birthday_listeners
+        index_listeners = self._birthday_index_listeners
+        transaction = self._transaction
+        self._version += 1
+        for name, packed_phones, birthday_ordinal in rows:
+            if name in data:
+                self._restore_record(name, packed_phones, birthday_ordinal)
+                continue
+            record = from_packed(name, packed_phones, birthday_ordinal)
+            record._book = self
+            name = record.name.value
+            if transaction is not None:
+                transaction._before.setdefault(name, None)
+            data[name] = record
+            self._index_name(name)
+            if phones_index is not None:
+                for packed in record._phones:
+                    if packed in phones_index:
+                        self._index_phone(record, packed)
+                    else:
+                        phones_index[packed] = record
+            if birthday_ordinal:
+                birthday = fromordinal(birthday_ordinal)
+                key = (birthday.month, birthday.day)
+                bucket = birthdays.get(key)
+                if bucket is None:
+                    birthdays[key] = {name: record}
+                else:
+                    bucket[name] = record
+                for listener in index_listeners:
+                    listener(name)
+                for listener in listeners:
+                    listener(record)
+
+    def _index_record(self, record: Record) -> None:
+        """Add a record to all book indexes."""
+        for packed in record._phones:
+            self._index_phone(record, packed)
+        self._index_birthday(record)
+        self._index_name(record.name.value)
+
+    def _index_birthday(self, record: Record) -> None:
+        if record._birthday:
+            birthday = date.fromordinal(record._birthday)
+            self._birthdays.setdefault((birthday.month, birthday.day), {})[record.name.value] = record
+            for listener in self._birthday_index_listeners:
+                listener(record.name.value)
+
+    def _unindex_record(self, record: Record) -> None:
+        """Remove a record from all book indexes."""
+        self._unindex_name(record.name.value)
+        for packed in record._phones:
+            self._unindex_phone(record, packed)
+        if record.birthday is not None:
+            self._unindex_birthday(record, record.birthday)
+
+    def _unindex_birthday(self, record: Record, birthday: Birthday) -> None:
+        key = (birthday.value.month, birthday.value.day)
+        bucket = self._birthdays.get(key)
+        if bucket is not None:
+            bucket.pop(record.name.value, None)
+            if not bucket:
+                del self._birthdays[key]
+            for listener in self._birthday_index_listeners:
+                listener(record.name.value)
+
+    def _index_name(self, name: str) -> None:
+        if self._sorted_names is not None:
+            self._pending_names.add((name.casefold(), name))
+        if self._near_names is not None:
+            self._add_near_name(name)
+        if self._trigrams is not None:
+            for gram in _trigrams(name):
+                self._trigrams.setdefault(gram, set()).add(name)
+
+    def _unindex_name(self, name: str) -> None:
+        key = (name.casefold(), name)
+        if self._sorted_names is not None:
+            if key in self._pending_names:
+                self._pending_names.discard(key)
+            else:
+                position = bisect_left(self._sorted_names, key)
+                if position < len(self._sorted_names) and self._sorted_names[position] == key:
+                    del self._sorted_names[position]
+        if self._near_names is not None:
+            self._near_removed += 1
+        if self._trigrams is not None:
+            for gram in _trigrams(name):
+                names = self._trigrams.get(gram)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._trigrams[gram]
+
+    def _index_phone(self, record: Record, packed: int) -> None:
+        if self._phones is None:
+            return
+        owners = self._phones.get(packed)
+        if owners is None:
+            self._phones[packed] = record
+        elif isinstance(owners, tuple):
+            if record not in owners:
+                self._phones[packed] = owners + (record,)
+        elif owners is not record:
+            self._phones[packed] = (owners, record)
+
+    def _unindex_phone(self, record: Record, packed: int) -> None:
+        if self._phones is None:
+            return
+        owners = self._phones.get(packed)
+        if owners is record:
+            del self._phones[packed]
+        elif isinstance(owners, tuple) and record in owners:
+            rest = tuple(owner for owner in owners if owner is not record)
+            self._phones[packed] = rest[0] if len(rest) == 1 else rest
+
+    def _phone_added(self, record: Record, packed: int) -> None:
+        self._index_phone(record, packed)
+        super()._phone_added(record, packed)
+
+    def _phone_removed(self, record: Record, packed: int) -> None:
+        self._unindex_phone(record, packed)
+        super()._phone_removed(record, packed)
+
+    def _phone_edited(self, record: Record, old_packed: int, new_packed: int) -> None:
+        self._unindex_phone(record, old_packed)
+        self._index_phone(record, new_packed)
+        super()._phone_edited(record, old_packed, new_packed)
+
+    def _birthday_changed(self, record: Record, old_birthday: Birthday | None) -> None:
+        if old_birthday is not None:
+            self._unindex_birthday(record, old_birthday)
+        self._index_birthday(record)
+        super()._birthday_changed(record, old_birthday)
+
+    def find_by_phone(self, phone_number: str) -> Record | None:
+        """Find the Record owning a phone number. Returns None if not found."""
+        if not Phone.is_valid(phone_number):
+            return None
+        owners = self._phone_index().get(_pack_phone(phone_number))
+        if isinstance(owners, tuple):
+            return owners[0]
+        return owners
+
+    # The loaders leave the phone and name indexes to the first query needing them, or to build_indexes.
+    # An index being built takes in the changes of the records as they happen, and walks a backlog of
+    # the records that were in the book when it started, skipping those removed since.
+    def build_indexes(self, budget: int | None = None) -> bool:
+        """
+        Build the indexes left for later a step at a time, so that a driver can finish them between
+        commands after startup. The book answers correctly at any point, a query needing an unfinished
+        index finishes it first.
+
+        Args:
+            budget (int | None): The most records to index in this step, all of them when None.
+        Returns:
+            bool: True once every index is complete.
+        """
+        if not self._build_phone_index(budget):
+            return False
+        if not self._build_name_index(budget):
+            return False
+        self._sync_names()
+        return True
+
+    def _phone_index(self) -> dict[int, Record | tuple[Record, ...]]:
+        if self._phones is None or self._phone_backlog:
+            self._build_phone_index()
+        return self._phones
+
+    def _build_phone_index(self, budget: int | None = None) -> bool:
+        if self._phones is None:
+            self._phone_backlog = deque(self.data.values())
+            self._phones = {}
+        backlog = self._phone_backlog
+        for _ in range(len(backlog) if budget is None else min(budget, len(backlog))):
+            record = backlog.popleft()
+            if record._book is self:
+                for packed in record._phones:
+                    self._index_phone(record, packed)
+        return not backlog
+
+    def _build_name_index(self, budget: int | None = None) -> bool:
+        if self._sorted_names is None and budget is None:
+            # all at once: the names of the book are unique, no backlog or set is needed
+            self._sorted_names = _sorted_name_keys([(name.casefold(), name) for name in self.data])
+            return True
+        if self._sorted_names is None:
+            self._name_backlog = deque(self.data)
+            self._sorted_names = []
+        backlog, data = self._name_backlog, self.data
+        names = [backlog.popleft() for _ in range(len(backlog) if budget is None else min(budget, len(backlog)))]
+        self._pending_names.update([(name.casefold(), name) for name in names if name in data])
+        return not backlog
+
+    def _sync_names(self) -> None:
+        """Merge the names added since the last query into the sorted list."""
+        if self._sorted_names is None or self._name_backlog:
+            self._build_name_index()
+        pending = self._pending_names
+        if not pending:
+            return
+        if len(pending) < 64:
+            for key in pending:
+                insort(self._sorted_names, key)
+        else:
+            added = _sorted_name_keys(pending)
+            if self._sorted_names:
+                # both lists are sorted, so timsort merges the two runs in linear time
+                self._sorted_names.extend(added)
+                self._sorted_names.sort()
+            else:
+                self._sorted_names = added
+        pending.clear()
+
+    def _search_prefix(self, prefix: str, limit: int) -> list[str]:
+        self._sync_names()
+        sorted_names = self._sorted_names
+        names = []
+        position = bisect_left(sorted_names, (prefix, ""))
+        while len(names) < limit and position < len(sorted_names):
+            folded, name = sorted_names[position]
+            if not folded.startswith(prefix):
+                break
+            names.append(name)
+            position += 1
+        return names
+
+    def _add_near_name(self, name: str) -> None:
+        ident = len(self._near_names)
+        self._near_names.append(name)
+        pending = self._near_pending
+        for key in _deletion_keys(name.casefold()):
+            idents = pending.get(key)
+            if idents is None:
+                pending[key] = [ident]
+            else:
+                idents.append(ident)
+            self._near_pending_count += 1
+
+    def _sync_near_names(self) -> None:
+        """Build the deletion key index, or fold the names added since the last query into its sorted array."""
+        keys = self._near_keys
+        if self._near_names is None or self._near_removed > max(len(self.data), 1024):
+            names = list(self.data)
+            entries = []
+            for ident, name in enumerate(names):
+                entries += [key << 32 | ident for key in _deletion_keys(name.casefold())]
+        elif self._near_pending_count > len(keys) // 8 + 4096:
+            names = self._near_names
+            entries = keys.tolist()
+            for key, idents in self._near_pending.items():
+                entries += [key << 32 | ident for ident in idents]
+        else:
+            return
+        entries.sort()
+        self._near_names = names
+        self._near_keys = array("Q", entries)
+        self._near_pending = {}
+        self._near_pending_count = 0
+        self._near_removed = 0
+
+    def _search_near(self, query: str, limit: int, max_distance: int) -> list[str]:
+        """Fuzzy search for at most one edit: only the names sharing a deletion key with the query are compared."""
+        self._sync_near_names()
+        keys, names, data = self._near_keys, self._near_names, self.data
+        idents = set()
+        for key in _deletion_keys(query):
+            idents.update(self._near_pending.get(key, ()))
+            position, end = bisect_left(keys, key << 32), (key + 1) << 32
+            while position < len(keys) and keys[position] < end:
+                idents.add(keys[position] & _HASH_MASK)
+                position += 1
+
+        # a name removed and added again has two ids, the set keeps it once
+        matches = set()
+        for ident in idents:
+            name = names[ident]
+            if name in data:
+                distance = _near_distance(query, name.casefold())
+                if distance <= max_distance:
+                    matches.add((distance, name))
+        return [name for _, name in sorted(matches)[:limit]]
+
+    def _search_fuzzy(self, query: str, limit: int, max_distance: int) -> list[str]:
+        if max_distance <= 1:
+            return self._search_near(query, limit, max_distance)
+        if self._trigrams is None:
+            self._trigrams = {}
+            for name in self.data:
+                for gram in _trigrams(name):
+                    self._trigrams.setdefault(gram, set()).add(name)
+
+        postings = sorted((self._trigrams.get(gram, set()) for gram in _trigrams(query)), key=len)
+        # every edit destroys at most 3 trigrams, so a match shares at least this many with the query
+        needed = len(postings) - 3 * max_distance
+        if needed > 0:
+            # a name missing all of the rarest len - needed + 1 trigrams cannot share enough of them,
+            # so only those short posting sets are scanned and the common trigrams are only probed
+            rare, common = postings[:len(postings) - needed + 1], postings[len(postings) - needed + 1:]
+            hits: dict[str, int] = {}
+            for names in rare:
+                for name in names:
+                    hits[name] = hits.get(name, 0) + 1
+            candidates = [name for name, count in hits.items()
+                          if count + sum(name in names for names in common) >= needed]
+        else:
+            # the query is too short for the trigrams to filter anything out
+            candidates = [name for name in self.data if abs(len(name) - len(query)) <= max_distance]
+
+        matches = []
+        for name in candidates:
+            distance = _edit_distance(query, name.casefold(), max_distance)
+            if distance <= max_distance:
+                matches.append((distance, name))
+        matches.sort()
+        return [name for _, name in matches[:limit]]
+
+    def get_upcoming_birthdays(self, days: int = 7, today: date | None = None) -> list[dict[str,str]]:
+        """
+        Function return a list of users whose birthdays occur within the next `days` days,
+        adjusting for leap-year dates and weekend celebrations.
+        Only the birthday buckets inside the window are visited, so the cost does not depend on the book size.
+
+        Args:
+            days (int): Size of the window in days, today included (defaults to 7).
+            today (date | None): The first day of the window (defaults to the current date).
+        Returns:
+            list[dict[str, str]]: A list of dictionaries, each with "name" and "congratulation_date" (DD.MM.YYYY)
+                                for birthdays falling within the window, ordered by congratulation date and name.
+                                Weekend birthdays are shifted to the following Monday.
+                                Feb 29 birthdays in non-leap years are shifted to March 1.
+        """
+        return _upcoming_birthdays(self._born_on, days, today)
+
+    def _born_on(self, key: tuple[int, int]):
+        """The names in the birthday bucket of a (month, day), for the readers of the birthday index."""
+        return self._birthdays.get(key, ())
+    
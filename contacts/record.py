@@ -0,0 +1,205 @@
+import sys
+from array import array
+from contextlib import nullcontext
+
+from .fields import Birthday, Name, Phone, UserValueError, _pack_phone, _unpack_phone
+
+# Shared do-nothing lock for books that are used from one thread
+_NO_LOCK = nullcontext()
+
+# Phones of a record that outgrew a plain array
+class PhoneSet:
+    """
+    Drop-in replacement for the array("Q") of packed phones, for records with many phones (shared lines, PBX).
+    It keeps the array for the order and adds a hash index of the slot of every phone, so membership,
+    append, remove, index and replacing a phone in place are O(1) instead of scans of the array.
+    A removed phone leaves a tombstone in its slot, so no other slot moves; the array is compacted when
+    tombstones outnumber phones. Slots returned by index() are only meant for __setitem__.
+
+    Args:
+        packed_phones (Iterable[int]): Initial packed phones, without duplicates.
+    """
+    __slots__ = ("_packed", "_slots")
+
+    _TOMBSTONE = (1 << 64) - 1  # never a packed phone, those are below 10**10
+
+    def __init__(self, packed_phones=()):
+        self._packed = array("Q", packed_phones)
+        self._slots = {packed: slot for slot, packed in enumerate(self._packed)}
+
+    def _compact(self) -> None:
+        """Drop the tombstones, renumbering the slots."""
+        self._packed = array("Q", iter(self))
+        self._slots = {packed: slot for slot, packed in enumerate(self._packed)}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self):
+        if len(self._slots) == len(self._packed):
+            return iter(self._packed)
+        return (packed for packed in self._packed if packed != self._TOMBSTONE)
+
+    def __contains__(self, packed: int) -> bool:
+        return packed in self._slots
+
+    def append(self, packed: int) -> None:
+        self._slots[packed] = len(self._packed)
+        self._packed.append(packed)
+
+    def remove(self, packed: int) -> None:
+        slot = self._slots.pop(packed, None)
+        if slot is None:
+            raise ValueError("PhoneSet.remove(x): x not in PhoneSet")
+        self._packed[slot] = self._TOMBSTONE
+        if 2 * len(self._slots) < len(self._packed):
+            self._compact()
+
+    def index(self, packed: int) -> int:
+        slot = self._slots.get(packed)
+        if slot is None:
+            raise ValueError("PhoneSet.index(x): x not in PhoneSet")
+        return slot
+
+    def __setitem__(self, slot: int, packed: int) -> None:
+        del self._slots[self._packed[slot]]
+        self._packed[slot] = packed
+        self._slots[packed] = slot
+
+    def tobytes(self) -> bytes:
+        """The phones as native uint64 values, like array.tobytes."""
+        if len(self._slots) != len(self._packed):
+            self._compact()
+        return self._packed.tobytes()
+
+    def __repr__(self) -> str:
+        return f"PhoneSet([{', '.join(_unpack_phone(packed) for packed in self)}])"
+
+# Class for a contact record, which includes a name and a list of phone numbers
+class Record:
+    # compact layout: phones packed into an array of uint64 (a PhoneSet once there are many of them),
+    # birthday kept as a date ordinal (0 - not set)
+    __slots__ = ("name", "_phones", "_birthday", "_book", "_version")
+
+    # a record switches from the array to a PhoneSet when it gets more phones than this
+    PHONE_INDEX_THRESHOLD = 16
+
+    def __init__(self, name:str):
+        self.name = Name(name)
+        self._phones = array("Q")
+        self._birthday = 0
+        self._book = None # the AddressBook holding this record, used to keep its indexes in sync
+        self._version = 0 # bumped by every change, so cached replies about the record can tell they are stale
+
+    @property
+    def phones(self) -> tuple[Phone, ...]:
+        """Phones of the record in insertion order. The tuple is a read-only view, use the add/remove/edit methods to change it."""
+        return tuple([Phone._from_packed(packed) for packed in self._phones])
+
+    @property
+    def birthday(self) -> Birthday | None:
+        if not self._birthday:
+            return None
+        return Birthday._from_ordinal(self._birthday)
+
+    def add_birthday(self, birthday: str) -> None:
+        self._set_birthday(Birthday(birthday).value.toordinal())
+
+    def _set_birthday(self, ordinal: int) -> None:
+        """Set an already validated birthday given as a date ordinal."""
+        with self._locked():
+            self._changing()
+            old_birthday = self.birthday
+            self._birthday = ordinal
+            if self._book is not None:
+                self._book._birthday_changed(self, old_birthday)
+
+    def _locked(self):
+        """Lock guarding a change of the record: the book holding it decides, a detached record needs none."""
+        book = self._book
+        return _NO_LOCK if book is None else book._record_lock(self)
+
+    def _changing(self) -> None:
+        """Called right before the record changes, so that an open transaction of its book can save it first."""
+        self._version += 1
+        book = self._book
+        if book is not None and book._transaction is not None:
+            book._transaction._touch(self.name.value)
+
+    def _find_packed(self, phone_number: str) -> int | None:
+        """Return the packed phone if the record has it, None otherwise."""
+        if not Phone.is_valid(phone_number):
+            return None
+        packed = _pack_phone(phone_number)
+        return packed if packed in self._phones else None
+
+    def find_phone(self, phone_number: str) -> Phone | None:
+        """Find a phone in the record by its number."""
+        packed = self._find_packed(phone_number)
+        if packed is None:
+            return None
+        return Phone._from_packed(packed)
+
+    def add_phone(self, phone_number: str) -> None:
+        """Add a new phone to the record."""
+        if self._find_packed(phone_number) is None:
+            self._add_packed(_pack_phone(Phone(phone_number).value))
+
+    def _add_packed(self, packed: int) -> None:
+        """Add an already validated phone given in its packed form, unless the record has it."""
+        with self._locked():
+            if packed not in self._phones:
+                if len(self._phones) == self.PHONE_INDEX_THRESHOLD and type(self._phones) is array:
+                    self._phones = PhoneSet(self._phones)
+                self._changing()
+                self._phones.append(packed)
+                if self._book is not None:
+                    self._book._phone_added(self, packed)
+
+    def remove_phone(self, phone_number: str) -> bool:
+        """Removes a phone from the record by its number."""
+        with self._locked():
+            packed = self._find_packed(phone_number)
+            if packed is not None:
+                self._changing()
+                self._phones.remove(packed)
+                if self._book is not None:
+                    self._book._phone_removed(self, packed)
+                return True
+            else:
+                return False
+
+
+    def edit_phone(self, old_phone_number: str, new_phone_number: str) -> bool:
+        """Edit an existing phone number in the record. """
+        if not Phone.is_valid(old_phone_number):
+            raise UserValueError("Invalid old phone number format. It must be a string of exactly 10 digits.")
+        if not Phone.is_valid(new_phone_number):
+            raise UserValueError("Invalid new phone number format. It must be a string of exactly 10 digits.") 
+
+        old_packed, new_packed = _pack_phone(old_phone_number), _pack_phone(new_phone_number)
+        with self._locked():
+            if old_packed in self._phones and new_packed not in self._phones:
+                self._changing()
+                self._phones[self._phones.index(old_packed)] = new_packed
+                if self._book is not None:
+                    self._book._phone_edited(self, old_packed, new_packed)
+                return True
+            else:
+                return False
+
+    @classmethod
+    def _from_packed(cls, name: str, packed_phones, birthday_ordinal: int) -> "Record":
+        """Build a detached record from its packed form without validating it again."""
+        record = cls.__new__(cls)
+        record.name = Name.__new__(Name)
+        record.name.value = sys.intern(name)
+        phones = array("Q", packed_phones)
+        record._phones = phones if len(phones) <= cls.PHONE_INDEX_THRESHOLD else PhoneSet(phones)
+        record._birthday = birthday_ordinal
+        record._book = None
+        record._version = 0
+        return record
+
+    def __str__(self):
+        return f"Contact name: {self.name.value}, phones: {'; '.join(_unpack_phone(p) for p in self._phones)}"
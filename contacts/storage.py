@@ -0,0 +1,336 @@
+import gc
+import os
+import re
+import struct
+import sys
+import zlib
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on Windows, a second process loading the directory is not detected
+    fcntl = None
+
+# On-disk layout of a storage directory:
+#   snapshot.bin       - binary image of the whole book, tagged with a generation number
+#   journal-<gen>.log  - append-only log of the mutations made after the snapshot of the same generation
+#   lock               - locked by the process that loaded the storage, only one may write to it
+# Compaction writes a snapshot of the next generation and starts a new journal, so a crash at any
+# point leaves either the old snapshot with its journal or the new snapshot with an empty journal.
+
+SNAPSHOT_MAGIC = b"ABK2"
+SNAPSHOT_HEADER = struct.Struct("<4sQI")    # magic, generation, number of records
+SNAPSHOT_RECORD = struct.Struct("<III")     # name length, birthday ordinal (0 - not set), number of phones
+# Record layout by snapshot magic: ABK1 snapshots, with 16-bit name lengths and phone counts, are still read
+SNAPSHOT_RECORDS = {b"ABK1": struct.Struct("<HIH"), SNAPSHOT_MAGIC: SNAPSHOT_RECORD}
+SNAPSHOT_CRC = struct.Struct("<I")
+LOCK_FILE = "lock"
+
+
+class StorageError(Exception):
+    pass
+
+
+# Journal fields are separated by tabs, one mutation per line
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+_UNESCAPED = {"\\": "\\", "t": "\t", "n": "\n"}
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return re.sub(r"\\(.)", lambda match: _UNESCAPED[match.group(1)], value)
+
+def _parse_birthday(value: str) -> int:
+    """Turn a DD.MM.YYYY string written by the journal into a date ordinal (0 - not set)."""
+    if not value:
+        return 0
+    return date(int(value[6:]), int(value[3:5]), int(value[:2])).toordinal()
+
+
+class Storage:
+    """
+    Persistent storage for an AddressBook: a binary snapshot plus a write-ahead journal.
+
+    Args:
+        path (str): Directory holding the storage files, created if missing.
+        sync_every (int): Number of journal entries written between two fsync calls.
+                          1 makes every command durable, bigger values trade the last few
+                          commands on a power loss for throughput.
+        compact_every (int): Number of journal entries after which the journal is folded into a new snapshot.
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, compact_every: int = 100_000):
+        self.path = path
+        self.sync_every = sync_every
+        self.compact_every = compact_every
+        self.generation = 0
+        self._book = None
+        self._journal_file = None
+        self._lock_file = None
+        self._entries = 0   # entries in the current journal
+        self._unsynced = 0  # entries written since the last fsync
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.path, "snapshot.bin")
+
+    def journal_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"journal-{generation}.log")
+
+    def load(self, book):
+        """
+        Fill an empty book from the snapshot and the journal tail, then record every further mutation of it.
+
+        Args:
+            book (AddressBook): The book to fill.
+        Returns:
+            AddressBook: The same book.
+        Raises:
+            StorageError: If another process has loaded the same directory.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self._lock()
+        try:
+            # loading creates millions of objects that all stay alive, cyclic GC passes over them are pure overhead
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                self.generation = self._load_snapshot(book)
+                self._entries = self._replay_journal(book)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            self._remove_stale_journals()
+            self._journal_file = open(self.journal_path(self.generation), "ab")
+        except BaseException:
+            self._unlock()
+            raise
+        self._book = book
+        book._journal = self
+        return book
+
+    def read(self, book):
+        """
+        Fill an empty book from the snapshot and the journal without taking the storage over: nothing is
+        locked, written or removed, so another process may have it loaded meanwhile. The book sees the
+        journal entries that process has flushed so far, and its own mutations are not recorded.
+
+        Args:
+            book (AddressBook): The book to fill.
+        Returns:
+            AddressBook: The same book.
+        """
+        while True:
+            generation, count, snapshot = self._read_snapshot()
+            journal = self._read_file(self.journal_path(generation))
+            # a compaction of the writer removed the journal after the snapshot was read: read the new one
+            if journal is None and self._read_snapshot()[0] != generation:
+                continue
+            break
+        if snapshot is not None:
+            book._restore_records(self._read_records(snapshot, count))
+        journal = journal or b""
+        # a line without its newline is still being written
+        self._replay(book, journal[:journal.rfind(b"\n") + 1])
+        return book
+
+    def _lock(self) -> None:
+        """Lock the directory for this process, failing if another one holds it."""
+        if fcntl is None:
+            return
+        lock_file = open(os.path.join(self.path, LOCK_FILE), "ab")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise StorageError(f"The address book in {self.path} is already open in another process.") from None
+        self._lock_file = lock_file
+
+    def _unlock(self) -> None:
+        if self._lock_file is not None:
+            self._lock_file.close()  # closing the file releases the lock
+            self._lock_file = None
+
+    @staticmethod
+    def _read_file(path: str) -> bytes | None:
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _load_snapshot(self, book) -> int:
+        generation, count, data = self._read_snapshot()
+        if data is not None:
+            book._restore_records(self._read_records(data, count))
+        return generation
+
+    def _read_snapshot(self) -> tuple[int, int, bytes | None]:
+        """Read and check the snapshot: its generation, number of records and data, (0, 0, None) if there is none."""
+        data = self._read_file(self.snapshot_path)
+        if data is None:
+            return 0, 0, None
+
+        if len(data) < SNAPSHOT_HEADER.size + SNAPSHOT_CRC.size:
+            raise StorageError(f"Snapshot {self.snapshot_path} is truncated.")
+        (crc,) = SNAPSHOT_CRC.unpack_from(data, len(data) - SNAPSHOT_CRC.size)
+        view = memoryview(data)[:-SNAPSHOT_CRC.size]
+        if zlib.crc32(view) != crc:
+            raise StorageError(f"Snapshot {self.snapshot_path} is corrupted.")
+        magic, generation, count = SNAPSHOT_HEADER.unpack_from(view, 0)
+        if magic not in SNAPSHOT_RECORDS:
+            raise StorageError(f"{self.snapshot_path} is not an address book snapshot.")
+        return generation, count, data
+
+    @staticmethod
+    def _read_records(data: bytes, count: int):
+        """Yield name, packed phones and birthday ordinal of every record stored in a snapshot."""
+        offset = SNAPSHOT_HEADER.size
+        record_format = SNAPSHOT_RECORDS[bytes(data[:len(SNAPSHOT_MAGIC)])]
+        unpack_record = record_format.unpack_from
+        record_size = record_format.size
+        phone_formats = {}
+        for _ in range(count):
+            name_length, birthday, phone_count = unpack_record(data, offset)
+            offset += record_size
+            name = data[offset:offset + name_length].decode("utf-8")
+            offset += name_length
+            phone_format = phone_formats.get(phone_count)
+            if phone_format is None:
+                phone_format = phone_formats[phone_count] = struct.Struct(f"<{phone_count}Q")
+            phones = phone_format.unpack_from(data, offset)
+            offset += phone_format.size
+            yield name, phones, birthday
+
+    def _replay_journal(self, book) -> int:
+        path = self.journal_path(self.generation)
+        data = self._read_file(path)
+        if data is None:
+            return 0
+
+        # a line without its newline is a write torn by a crash, it was never acknowledged
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            with open(path, "r+b") as file:
+                file.truncate(complete)
+        return self._replay(book, data[:complete])
+
+    def _replay(self, book, data: bytes) -> int:
+        """Apply the complete journal lines in `data` to a book, returning their number."""
+        entries = 0
+        for line in data[:-1].decode("utf-8").split("\n") if data else ():
+            op, *fields = [_unescape(field) for field in line.split("\t")]
+            self._apply(book, op, fields)
+            entries += 1
+        return entries
+
+    @staticmethod
+    def _apply(book, op: str, fields: list[str]) -> None:
+        if op == "R":
+            name, phones, birthday = fields
+            book._restore_record(name, [int(phone) for phone in phones.split(";") if phone], _parse_birthday(birthday))
+            return
+        if op == "D":
+            book.delete(fields[0])
+            return
+
+        record = book.find(fields[0])
+        if record is None:
+            raise StorageError(f"Journal refers to unknown contact {fields[0]}.")
+        if op == "P":
+            record.add_phone(fields[1])
+        elif op == "X":
+            record.remove_phone(fields[1])
+        elif op == "E":
+            record.edit_phone(fields[1], fields[2])
+        elif op == "B":
+            record.add_birthday(fields[1])
+        else:
+            raise StorageError(f"Unknown journal entry {op}.")
+
+    def _remove_stale_journals(self) -> None:
+        current = os.path.basename(self.journal_path(self.generation))
+        for file_name in os.listdir(self.path):
+            if file_name.startswith("journal-") and file_name != current:
+                os.remove(os.path.join(self.path, file_name))
+
+    def log(self, op: str, *fields: str) -> None:
+        """Append one mutation to the journal. Called by the AddressBook."""
+        line = "\t".join((op, *(_escape(field) for field in fields)))
+        self._journal_file.write(line.encode("utf-8") + b"\n")
+        self._entries += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+        if self._entries >= self.compact_every:
+            self.compact()
+
+    def sync(self) -> None:
+        """Make every journal entry written so far durable."""
+        if self._journal_file is not None and self._unsynced:
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+            self._unsynced = 0
+
+    def compact(self) -> None:
+        """Write the book to a snapshot of the next generation and start an empty journal."""
+        generation = self.generation + 1
+        self._write_snapshot(generation)
+
+        self._journal_file.close()
+        old_journal = self.journal_path(self.generation)
+        self.generation = generation
+        self._journal_file = open(self.journal_path(generation), "ab")
+        os.remove(old_journal)
+        self._entries = 0
+        self._unsynced = 0
+
+    def _write_snapshot(self, generation: int) -> None:
+        buffer = bytearray(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation, len(self._book)))
+        pack_record = SNAPSHOT_RECORD.pack
+        for name, phones, birthday_ordinal in self._book._rows():
+            name = name.encode("utf-8")
+            buffer += pack_record(len(name), birthday_ordinal, len(phones))
+            buffer += name
+            if sys.byteorder == "little":
+                buffer += phones.tobytes()
+            else:
+                buffer += struct.pack(f"<{len(phones)}Q", *phones)
+        buffer += SNAPSHOT_CRC.pack(zlib.crc32(buffer))
+
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(buffer)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self._sync_directory()
+
+    def _sync_directory(self) -> None:
+        # the rename itself must reach the disk before the old journal is removed
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.path, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def close(self) -> None:
+        """Fold the journal into the snapshot and release the files."""
+        if self._journal_file is None:
+            return
+        if self._entries:
+            self.compact()
+        self.sync()
+        self._release()
+
+    def _release(self) -> None:
+        """Close the journal as it is and unlock the directory."""
+        self._journal_file.close()
+        self._journal_file = None
+        self._unlock()
+        if self._book is not None:
+            self._book._journal = None
+            self._book = None
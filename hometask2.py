@@ -1,168 +1,51 @@
-from collections import UserDict
-from datetime import datetime, timedelta
-
-class UserValueError(ValueError):
-    pass
-
-# Basic class for fields in the address book
-class Field:
-    def __init__(self, value):
-        self.value = value
-
-    def __str__(self):
-        return str(self.value)
-
-# Class for names with validation
-class Name(Field):
-    def __init__(self, value: str):
-        #validate name: must be a non-empty string
-        if not isinstance(value, str) or not value.strip():
-            raise UserValueError("The name must be a non-empty string.")
-        super().__init__(value.strip())
-
-
-# Class for phone numbers with validation
-class Phone(Field):
-    def __init__(self, value:str):
-        # vakidate phone number: must be a string of 10 digits
-        if not (isinstance(value, str) and value.isdigit() and len(value) == 10):
-            raise UserValueError("The phone number must be a string of exactly 10 digits.")
-        super().__init__(value)
-
-# Class for birthdays with validation and save as a date object
-class Birthday(Field):
-    def __init__(self, value:str):
-        if not isinstance(value, str):
-            raise UserValueError("Birthday must be a string in the format DD.MM.YYYY")
-        try:
-             date_input = datetime.strptime(value, "%d.%m.%Y").date()
-        except ValueError:
-            raise UserValueError("Invalid date format. Use DD.MM.YYYY")
-        super().__init__(date_input)
-
-# Class for a contact record, which includes a name and a list of phone numbers
-class Record:
-    def __init__(self, name:str):
-        self.name = Name(name)
-        self.phones = []
-        self.birthday = None
-
-    def add_birthday(self, birthday: str) -> None:
-        self.birthday = Birthday(birthday)
-
-    def find_phone(self, phone_number: str) -> Phone | None:
-        """Find a phone in the record by its number."""
-        for phone in self.phones:
-            if phone.value == phone_number:
-                return phone
-        return None
-
-    def add_phone(self, phone_number: str) -> None:
-        """Add a new phone to the record."""
-        phone_value = self.find_phone(phone_number)
-        if not phone_value:
-        #if not any(ph.value == phone_value for ph in self.phones):
-            self.phones.append(Phone(phone_number))
-
-    def remove_phone(self, phone_number: str) -> bool:
-        """Removes a phone from the record by its number."""
-        phone_remove = self.find_phone(phone_number)
-        if phone_remove:
-            self.phones.remove(phone_remove)
-            return True
-        else:
-            return False
-
-
-    def edit_phone(self, old_phone_number: str, new_phone_number: str) -> bool:
-        """Edit an existing phone number in the record. """
-        try:
-            Phone(old_phone_number) 
-        except ValueError as e:
-            raise UserValueError("Invalid old phone number format. It must be a string of exactly 10 digits.")
-        
-        try:
-            valid_new_phone = Phone(new_phone_number) 
-        except ValueError as e:
-            raise UserValueError("Invalid new phone number format. It must be a string of exactly 10 digits.") 
-
-        phone_to_edit = self.find_phone(old_phone_number)
-        if phone_to_edit and not self.find_phone(new_phone_number):
-            phone_to_edit.value = valid_new_phone.value
-            return True
-        else:
-            return False
-
-    def __str__(self):
-        return f"Contact name: {self.name.value}, phones: {'; '.join(p.value for p in self.phones)}"
-
-# Class for the address book, which holds multiple records
-class AddressBook(UserDict):
-    def add_record(self, record: Record):
-        """Adds a Record to the address book. If a record with the same name exists, it overwrites it."""
-        self.data[record.name.value] = record
-
-    def find(self, name: str) -> Record | None:
-        """Find a Record by name. Returns None if not found."""
-        return self.data.get(name)
-
-    def delete(self, name: str)-> bool:
-        """Delete a Record by name."""
-        if name in self.data:
-            del self.data[name]
-            return True
-        else:
-            return False
-    from datetime import datetime, timedelta
-
-    # Function to get upcoming birthdays within the next 7 days
-    def get_upcoming_birthdays(self) -> list[dict[str,str]]:
-        """
-        Function return a list of users whose birthdays occur within the next 7 days,
-        adjusting for leap-year dates and weekend celebrations.
+from contextlib import nullcontext
+from functools import wraps
+from itertools import islice
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from contacts import ENGINES, AddressBook, Birthday, DictAddressBook, Phone, Record, UserValueError
+from contacts.fields import _unpack_phone
+from contacts.storage import Storage, StorageError
+from instrumentation import instruments
+from resultcache import BOOK, CONTACT, TODAY, ResultCache
+
+# A reply is a string, or an iterable of lines for long listings, which the drivers write out as they come
+def write_reply(reply, stream) -> "ErrorMessage | None":
+    """
+    Write a command reply to a text stream, followed by a newline.
+    A listing produces its lines after its handler returned, so an error raised meanwhile is written
+    in place of the rest of it, as input_error would have reported it.
 
-        Args:
-            users (list[dict[str, str]]): A list of user dictionaries, each with "name" and "birthday" (DD.MM.YYYY).
-        Returns:
-            list[dict[str, str]]: A list of dictionaries, each with "name" and "congratulation_date" (DD.MM.YYYY)
-                                for birthdays falling within the next 7 days.
-                                Weekend birthdays are shifted to the following Monday.
-                                Feb 29 birthdays in non-leap years are shifted to March 1.
-        """
-        today = datetime.today().date()
-        result: list[dict[str, str]] = []  
-
-        for user in self.data.values():
-            user_birthday = user.birthday.value # birthday sttored as a date object
-            try:
-                birthday_this_year = user_birthday.replace(year=today.year)
-            except ValueError:
-                # If it was February 29 and the year is not a leap year, we celebrate March 1
-                birthday_this_year = datetime(today.year, 3, 1).date()
-
-            if birthday_this_year < today:
-                try:
-                    birthday_this_year = birthday_this_year.replace(year=today.year + 1)
-                except ValueError:   
-                    # If it will February 29 and the year is not a leap year, we celebrate March 1
-                    birthday_this_year = datetime(today.year+1, 3, 1).date()
-
-            days_count= (birthday_this_year - today).days
-
-            if 0 <= days_count <= 7:
-                iso_weekday = birthday_this_year.isoweekday()
-                if iso_weekday >= 6: # Saturday or Sunday
-                        congratulation_date=birthday_this_year+ timedelta(days= 8 - iso_weekday)
-                else:
-                        congratulation_date=birthday_this_year
-
-                result.append({"name": user.name.value,"congratulation_date": congratulation_date.strftime("%d.%m.%Y")})
-        return result
-    
-    def __str__(self):
-        if not self.data:
-            return "Address book is empty."
-        return "\n".join(str(record) for record in self.data.values())
+    Returns:
+        ErrorMessage | None: The error the listing ended with, None if it was written whole.
+    """
+    if isinstance(reply, str):
+        stream.write(reply)
+        stream.write("\n")
+        return None
+    try:
+        for line in reply:
+            stream.write(line)
+            stream.write("\n")
+    except Exception as e:
+        error = error_message(e)
+        stream.write(error)
+        stream.write("\n")
+        return error
+    return None
+
+# Reply of a command that failed: it prints like any other reply, but lets the drivers count failures
+# and tells the statistics the class of the error behind it
+class ErrorMessage(str):
+    def __new__(cls, text: str, error_type: str = "UserValueError"):
+        message = super().__new__(cls, text)
+        message.error_type = error_type
+        return message
 
 # decorator to handle input errors 
 def input_error(func):
@@ -176,23 +59,168 @@ def input_error(func):
      Returns:
          callable: The decorated function that handles input errors.
     """
+    @wraps(func)
     def inner(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except UserValueError as e:
-            return str(e) if str(e) else "Invalid value format. Please check your value."
-        except ValueError as e:
-            return "Give me name and phone or birthday please."
-        except KeyError:
-            return "Contact not found."
-        except IndexError:
-            return "Invalid number of arguments. Please check your input."
         except Exception as e:
-            return f"An unexpected error occurred: {e}"
+            return error_message(e)
     return inner
 
+def error_message(e: Exception) -> ErrorMessage:
+    """The user-friendly reply to a command that raised an error, see input_error."""
+    if isinstance(e, UserValueError):
+        return ErrorMessage(str(e) if str(e) else "Invalid value format. Please check your value.", type(e).__name__)
+    if isinstance(e, ValueError):
+        return ErrorMessage("Give me name and phone or birthday please.", type(e).__name__)
+    if isinstance(e, KeyError):
+        return ErrorMessage("Contact not found.", type(e).__name__)
+    if isinstance(e, IndexError):
+        return ErrorMessage("Invalid number of arguments. Please check your input.", type(e).__name__)
+    return ErrorMessage(f"An unexpected error occurred: {e}", type(e).__name__)
+
+
+# Messages returned when a command gets too few arguments
+NAME_VALUE_ERROR = "Give me name and phone or birthday please."
+ARGUMENTS_ERROR = "Invalid number of arguments. Please check your input."
+
+# Command registered in a CommandRouter
+class Command:
+    __slots__ = ("name", "handler", "arity", "aliases", "usage", "usage_error", "exits", "mutates", "undoable", "cached",
+                 "stats")
+
+    def __init__(self, name, handler, arity, aliases, usage, usage_error, exits, mutates, undoable, cached):
+        self.name = name
+        self.handler = handler
+        self.arity = arity
+        self.aliases = aliases
+        self.usage = usage
+        self.usage_error = ErrorMessage(usage_error, "UsageError")
+        self.exits = exits
+        self.mutates = mutates
+        self.undoable = mutates and undoable
+        self.cached = None if mutates else cached
+        self.stats = instruments.stats_for(name)
+
+    @property
+    def help(self) -> str:
+        """First line of the handler docstring."""
+        doc = (self.handler.__doc__ or "").strip()
+        return doc.splitlines()[0] if doc else ""
+
+
+class CommandRouter:
+    """
+    Registry of the bot commands: maps a command name or alias to its handler in one dict lookup
+    and checks the number of arguments before the handler runs.
+    Any driver (the interactive loop, a batch run, a server) can dispatch commands through it.
+    """
+
+    def __init__(self):
+        self._commands: dict[str, Command] = {}  # command names and aliases -> command
+        self._ordered: list[Command] = []          # registration order, used by the help text
+        # replies of the cached commands; None turns caching off
+        self.cache: ResultCache | None = ResultCache()
+
+    def command(self, name: str, *, arity: int = 0, aliases: tuple[str, ...] = (), usage: str = "",
+                usage_error: str = ARGUMENTS_ERROR, exits: bool = False, mutates: bool = False, undoable: bool = True,
+                cached: str | None = None):
+        """
+        Decorator registering a handler.
+
+        Args:
+            name (str): The command name.
+            arity (int): The minimum number of arguments.
+            aliases (tuple[str, ...]): Other names of the command.
+            usage (str): The arguments shown by help, like "<name> <phone>".
+            usage_error (str): The message returned when the command gets fewer than `arity` arguments.
+            exits (bool): True if the command ends the session.
+            mutates (bool): True if the command changes the book, so concurrent drivers must serialize it.
+            undoable (bool): For a command that changes the book: run it as one transaction of an AddressBook,
+                             rolled back if the command fails and undone by the undo command.
+            cached (str | None): For a command that only reads the book: what its reply depends on, so that
+                                 it can be kept in the router cache; resultcache.CONTACT for the contact named
+                                 by the first argument, BOOK for the whole book, TODAY for the book and the date.
+        Returns:
+            callable: The decorator, which returns the handler unchanged.
+        """
+        def register(handler):
+            command = Command(name, handler, arity, aliases, usage, usage_error, exits, mutates, undoable, cached)
+            for key in (name, *aliases):
+                if key in self._commands:
+                    raise ValueError(f"Command {key} is already registered.")
+                self._commands[key] = command
+            self._ordered.append(command)
+            return handler
+        return register
+
+    def resolve(self, name: str) -> Command | None:
+        """Find a command by its name or alias."""
+        return self._commands.get(name)
+
+    def dispatch(self, name: str, args, book) -> str:
+        """
+        Run a command.
+
+        Args:
+            name (str): The command name or alias, already lowercased.
+            args (Sequence[str]): The command arguments.
+            book (AddressBook): The book the command works on.
+        Returns:
+            str | Iterable[str]: The reply of the command, see write_reply.
+        """
+        command = self._commands.get(name)
+        if command is None:
+            if instruments.enabled:
+                stats = instruments.stats_for("(unknown)")
+                stats.counted += 1
+                stats.add_error("UnknownCommand")
+            return ErrorMessage("Invalid command.", "UnknownCommand")
+        if not instruments.enabled:
+            return self._run(command, args, book)
+
+        # the counters are bound to the command when it is registered, most calls only decrement one of them
+        stats = command.stats
+        countdown = stats.countdown
+        if countdown:
+            stats.countdown = countdown - 1
+            result = self._run(command, args, book)
+        else:
+            result = instruments.measure(stats, self._run, command, args, book)
+        if result.__class__ is ErrorMessage:
+            stats.add_error(result.error_type)
+        return result
+
+    def _run(self, command: Command, args, book):
+        if len(args) < command.arity:
+            return command.usage_error
+        if command.cached and self.cache is not None and isinstance(book, DictAddressBook):
+            return self.cache.call(command.name, command.cached, command.handler, args, book)
+        if command.undoable and isinstance(book, DictAddressBook):
+            return CommandRouter._run_undoable(command, args, book)
+        return command.handler(args, book)
+
+    @staticmethod
+    def _run_undoable(command: Command, args, book: DictAddressBook):
+        with book.transaction() as transaction:
+            result = command.handler(args, book)
+            if result.__class__ is ErrorMessage:
+                # a failed command leaves the book as it found it
+                transaction.rollback()
+        return result
+
+    def help_text(self) -> str:
+        lines = ["Available commands:"]
+        for command in self._ordered:
+            names = " | ".join((command.name, *command.aliases))
+            usage = f" {command.usage}" if command.usage else ""
+            lines.append(f"  {names}{usage} - {command.help}")
+        return "\n".join(lines)
+
+
+router = CommandRouter()
+
 
-@input_error
 def parse_input(user_input: str)-> tuple[str, ...]:
     """
     Parses user input into a command and its arguments.
@@ -213,6 +241,7 @@ def parse_input(user_input: str)-> tuple[str, ...]:
     cmd = cmd.strip().lower()
     return cmd, *args
 
+@router.command("add", arity=2, usage="<name> <phone>", usage_error=NAME_VALUE_ERROR, mutates=True)
 @input_error
 def add_contact(args:tuple[str, ...], book: AddressBook) -> str:
     """ 
@@ -225,8 +254,10 @@ def add_contact(args:tuple[str, ...], book: AddressBook) -> str:
     Returns:
         str: A message indicating whether the contact was added or updated.
     """
-    # raise ValueError if the number of arguments is not equal to 2
     name, phone, *_ = args
+    # validate before creating the record, so a wrong phone does not leave an empty contact behind
+    if not Phone.is_valid(phone):
+        raise UserValueError("The phone number must be a string of exactly 10 digits.")
     record = book.find(name)
     message = "Contact updated."
     if record is None:
@@ -237,6 +268,7 @@ def add_contact(args:tuple[str, ...], book: AddressBook) -> str:
     
     return message
 
+@router.command("change", arity=3, usage="<name> <old phone> <new phone>", usage_error=NAME_VALUE_ERROR, mutates=True)
 @input_error
 def change_contact(args: tuple[str, ...], book: AddressBook) -> str:  
     """
@@ -248,7 +280,6 @@ def change_contact(args: tuple[str, ...], book: AddressBook) -> str:
     Returns:
         str: A message indicating whether the contact was updated, the old phone number was not found, or the new phone number already exists.   
     """
-    # raise ValueError if the number of arguments is not equal to 3
     name, old_phone, new_phone, *_ = args
     record = book.find(name)
     if record:
@@ -263,6 +294,7 @@ def change_contact(args: tuple[str, ...], book: AddressBook) -> str:
         message =  f"Contact {name} not found."
     return message  
     
+@router.command("phone", arity=1, usage="<name>", cached=CONTACT)
 @input_error
 def show_phone(args: tuple[str, ...], book: AddressBook) -> str:
     """
@@ -274,11 +306,7 @@ def show_phone(args: tuple[str, ...], book: AddressBook) -> str:
     Returns:
         str: A message indicating the phone number for the contact or that the contact was not found.
     """
-    # raise index error if args is empty
-    try:
-        name, *_ = args
-    except Exception:
-        raise IndexError
+    name, *_ = args
     
     record = book.find(name)
     if record:
@@ -286,24 +314,96 @@ def show_phone(args: tuple[str, ...], book: AddressBook) -> str:
     else:
         return f"Contact {name} not found."
 
+@router.command("find-phone", arity=1, usage="<phone>")
+@input_error
+def find_phone(args: tuple[str, ...], book: AddressBook) -> str:
+    """
+    Shows the contact owning a given phone number.
+
+    Args:
+        args (tuple[str]): A tuple containing the phone number.
+        book (AddressBook): An instance of AddressBook where contacts are stored.
+    Returns:
+        str: A message with the contact name or that the phone number was not found.
+    """
+    phone, *_ = args
+
+    record = book.find_by_phone(phone)
+    if record:
+        return f"Phone number {phone} belongs to {record.name.value}."
+    else:
+        return f"Phone number {phone} not found."
+
+@router.command("search", arity=1, usage="<text>")
 @input_error
-def show_all(book: AddressBook) -> str:
+def search(args: tuple[str, ...], book: AddressBook) -> str:
     """
-    Returns a string representation of all contacts in the address book.
+    Searches contacts by the beginning of their name, or by a name one typo away if none starts with it.
 
     Args:
+        args (tuple[str]): A tuple containing the text to search for.
         book (AddressBook): An instance of AddressBook where contacts are stored.
     Returns:
-        str: A string containing all contacts and their phone numbers, or a message indicating that no contacts are available.
-    """      
-    if not book.data: 
+        str: A message with the names found or that nothing was found.
+    """
+    text, *_ = args
+
+    records = book.search(prefix=text) or book.search(fuzzy=text)
+    if records:
+        return f"Found: {', '.join(record.name.value for record in records)}."
+    else:
+        return f"No contacts matching {text}."
+
+@router.command("all", usage="[offset] [limit]", cached=BOOK)
+@input_error
+def show_all(args, book: AddressBook):
+    """
+    Returns all contacts in the address book, or one page of them.
+
+    Args:
+        args (tuple[str]): An optional number of contacts to skip and an optional number of contacts to show.
+        book (AddressBook): An instance of AddressBook where contacts are stored.
+    Returns:
+        str | Iterator[str]: The lines of the listing, produced while they are written out,
+                             or a message indicating that no contacts are available.
+    """
+    for value in args[:2]:
+        if not value.isdigit():
+            raise UserValueError("The offset and the limit must be non-negative integers.")
+    offset = int(args[0]) if args else 0
+    limit = int(args[1]) if len(args) > 1 else None
+    if not book:
         return "No contacts available."
-    result = ""
-    for name, record in book.data.items():
-        phones = ', '.join(phone.value for phone in record.phones)
-        result += f"\n{name}: {phones}"
-    return result
+    if offset >= len(book):
+        return f"No contacts after the first {len(book)}."
+    return _contact_lines(book, offset, limit)
+
+def _contact_lines(book: AddressBook, offset: int, limit: int | None):
+    yield ""
+    stop = None if limit is None else offset + limit
+    for name, record in islice(book.items(), offset, stop):
+        yield f"{name}: {', '.join(_unpack_phone(packed) for packed in record._phones)}"
 
+@router.command("delete", arity=1, usage="<name>", mutates=True)
+@input_error
+def delete_contact(args: tuple[str, ...], book: AddressBook) -> str:
+    """
+    Deletes a contact from the address book.
+
+    Args:
+        args (tuple[str]): A tuple containing the contact name.
+        book (AddressBook): An instance of AddressBook where contacts are stored.
+    Returns:
+        str: A message indicating whether the contact was deleted or not found.
+    """
+    name, *_ = args
+
+    if book.delete(name):
+        return f"Contact {name} deleted."
+    else:
+        return f"Contact {name} not found."
+
+@router.command("add-birthday", arity=2, usage="<name> <DD.MM.YYYY>", usage_error=NAME_VALUE_ERROR, mutates=True)
 @input_error
 def add_birthday(args, book) -> str:
     """
@@ -323,6 +423,7 @@ def add_birthday(args, book) -> str:
     else:
         return f"Contact {name} not found."
 
+@router.command("show-birthday", arity=1, usage="<name>", cached=CONTACT)
 @input_error
 def show_birthday(args, book) ->str:
     """
@@ -334,10 +435,7 @@ def show_birthday(args, book) ->str:
     Returns:
         str: A message indicating the birthday for the contact or that the contact was not found.
     """
-    try:
-        name, *_ = args
-    except Exception:
-        raise IndexError
+    name, *_ = args
     
     record = book.find(name)
     if record:
@@ -345,53 +443,288 @@ def show_birthday(args, book) ->str:
     else:
         return f"Contact {name} not found."
 
+@router.command("birthdays", usage="[days] [DD.MM.YYYY]", cached=TODAY)
 @input_error
-def birthdays(book)->str:
+def birthdays(args, book)->str:
     """ 
-    Returns a text of upcoming birthdays within the next 7 days.
+    Returns a text of upcoming birthdays within the next days (7 by default), from today or from a given date.
 
     Args:
+        args (tuple[str]): An optional number of days to look ahead and an optional first day of the window.
         book (AddressBook): An instance of AddressBook where contacts are stored.
     Returns:
         str: A string containing upcoming birthdays or a message indicating that there are no upcoming birthdays.
     """
+    days = 7
+    if args:
+        if not args[0].isdigit():
+            raise UserValueError("The number of days must be a non-negative integer.")
+        days = int(args[0])
+    start = None
+    if len(args) > 1:
+        start = Birthday.try_parse(args[1])
+        if start is None:
+            raise UserValueError("Invalid date format. Use DD.MM.YYYY")
     result=""
-    for user in book.get_upcoming_birthdays():
+    for user in book.get_upcoming_birthdays(days, start):
         result += f"\nUpcoming birthday for {user['name']} on {user['congratulation_date']}."
     if not result:
-        return "No upcoming birthdays in the next 7 days."
+        if start is not None:
+            return f"No upcoming birthdays in the {days} days from {args[1]}."
+        return f"No upcoming birthdays in the next {days} days."
     else:
         return result
     
 
-def main():
-    book = AddressBook()
+@router.command("undo", mutates=True, undoable=False)
+def undo(args, book: AddressBook) -> str:
+    """Reverts the last change made by a command."""
+    return "Last change undone." if book.undo() else "Nothing to undo."
+
+@router.command("redo", mutates=True, undoable=False)
+def redo(args, book: AddressBook) -> str:
+    """Applies again the last undone change."""
+    return "Last undone change redone." if book.redo() else "Nothing to redo."
+
+@router.command("hello")
+def hello(args, book) -> str:
+    """Greets the user."""
+    return "How can I help you?"
+
+@router.command("help")
+def show_help(args, book) -> str:
+    """Lists the available commands."""
+    return router.help_text()
+
+@router.command("stats", usage="[json | on | off | reset | profile [N | off] | memory [off] | cache [clear]]")
+@input_error
+def show_stats(args, book) -> str:
+    """
+    Shows the command statistics, or switches their collection and the profiling captures.
+
+    Args:
+        args (tuple[str]): Nothing for the report, "json" for the machine-readable dump, or a switch:
+                           "on"/"off"/"reset" for the counters, "profile [every]"/"profile off" to run every
+                           Nth command (100 by default) under cProfile, "memory"/"memory off" for tracemalloc,
+                           "cache" for the result cache counters, "cache clear" to empty it.
+        book (AddressBook): Not used.
+    Returns:
+        str: The report, the dump or a confirmation.
+    """
+    if not args:
+        if router.cache is None:
+            return instruments.report()
+        return f"{instruments.report()}\n{router.cache.report()}"
+    action, *rest = args
+    switch = rest[0].lower() if rest else ""
+    if action == "json":
+        return json.dumps(statistics())
+    if action in ("on", "off"):
+        instruments.enabled = action == "on"
+        return f"Statistics are {action}."
+    if action == "reset":
+        instruments.reset()
+        if router.cache is not None:
+            router.cache.stats.clear()
+        return "Statistics are reset."
+    if action == "profile" and switch == "off":
+        instruments.stop_profiling()
+        return "Profiling is off."
+    if action == "profile":
+        try:
+            every = int(switch) if switch else 100
+        except ValueError:
+            every = 0
+        if every < 1:
+            raise UserValueError("The profiling interval must be a positive integer, e.g. stats profile 100.")
+        instruments.start_profiling(every)
+        return f"Profiling every {every} commands."
+    if action == "memory" and switch == "off":
+        instruments.stop_tracing()
+        return "Memory tracing is off."
+    if action == "memory":
+        instruments.start_tracing()
+        return "Memory tracing is on."
+    if action == "cache":
+        if router.cache is None:
+            return "The result cache is off."
+        if switch == "clear":
+            router.cache.clear()
+            return "The result cache is cleared."
+        return router.cache.report()
+    raise UserValueError(f"Unknown statistics action {action}.")
+
+def statistics() -> dict:
+    """The command statistics with the result cache counters, in a form that serializes to JSON."""
+    dump = instruments.dump()
+    dump["cache"] = router.cache.dump() if router.cache is not None else None
+    return dump
+
+@router.command("exit", aliases=("close",), exits=True)
+def close(args, book) -> str:
+    """Closes the assistant bot."""
+    return "Good bye!"
+
+
+# Directory where the address book is kept between runs
+DATA_DIR = os.environ.get("ASSISTANT_BOT_DATA", "addressbook_data")
+
+# Buffer size for reading and writing in batch mode
+BATCH_BUFFER_SIZE = 1 << 20
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Assistant bot for an address book.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory where the address book is stored")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="run the commands of FILE (or of stdin) without prompts; "
+                             "this is the default when stdin is not a terminal")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="count the commands and write the statistics to FILE as JSON on exit "
+                             "(otherwise counting is off until the stats on command)")
+    parser.add_argument("--sync-every", type=int, default=64, metavar="N",
+                        help="journal entries written between two fsync calls; 1 makes every command durable, "
+                             "bigger values lose at most the last N - 1 changes on a power loss (default: 64)")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="indexed",
+                        help="how the book keeps the contacts, see the contacts package (default: indexed)")
+    parser.add_argument("--cache-size", type=int, default=1024, metavar="N",
+                        help="replies of read-only commands kept in the result cache, 0 turns it off (default: 1024)")
+    parser.add_argument("--cache-ttl", type=float, metavar="SECONDS",
+                        help="how long a cached reply is used at most (default: until the book changes)")
+    options = parser.parse_args(argv)
+    if options.sync_every < 1:
+        parser.error("--sync-every must be a positive number")
+    router.cache = ResultCache(options.cache_size, options.cache_ttl) if options.cache_size > 0 else None
+    if options.stats:
+        instruments.enabled = True
+
+    storage = Storage(options.data_dir, sync_every=options.sync_every)
+    book = ENGINES[options.engine]()
+    loader = None
+    try:
+        if options.batch is None and sys.stdin.isatty():
+            # the prompt comes first, the book loads while the user types
+            loader = BackgroundLoader(storage, book)
+            run(book, loader)
+        else:
+            storage.load(book)
+            run_batch(book, options.batch or "-")
+    except StorageError as e:
+        sys.exit(str(e))
+    finally:
+        if loader is not None:
+            # the first command has raised a load error already, the storage is closed only after the load
+            loader.join()
+        storage.close()
+        if options.stats:
+            with open(options.stats, "w", encoding="utf-8") as file:
+                json.dump(statistics(), file, indent=2)
+
+def run_batch(book: AddressBook, source: str = "-") -> tuple[int, int]:
+    """
+    Runs commands without prompts, reading and writing in large buffered chunks.
+    A summary with the throughput and the number of failed commands goes to stderr.
+
+    Args:
+        book (AddressBook): An instance of AddressBook where contacts are stored.
+        source (str): The file to read the commands from, "-" for stdin.
+    Returns:
+        tuple[int, int]: The number of commands run and the number of them that failed.
+    """
+    if source == "-":
+        commands = open(sys.stdin.fileno(), encoding="utf-8", buffering=BATCH_BUFFER_SIZE, closefd=False)
+    else:
+        commands = open(source, encoding="utf-8", buffering=BATCH_BUFFER_SIZE)
+    sys.stdout.flush()
+    output = open(sys.stdout.fileno(), "w", encoding="utf-8", buffering=BATCH_BUFFER_SIZE, closefd=False)
+
+    count = errors = 0
+    start = time.perf_counter()
+    with commands, output:
+        dispatch = router.dispatch
+        for user_input in commands:
+            command, *args = parse_input(user_input)
+            if not command:
+                continue
+            result = dispatch(command, args, book)
+            failure = write_reply(result, output)
+            count += 1
+            if failure is not None or isinstance(result, ErrorMessage):
+                errors += 1
+            spec = router.resolve(command)
+            if spec is not None and spec.exits:
+                break
+    elapsed = time.perf_counter() - start
+
+    rate = count / elapsed if elapsed else 0.0
+    print(f"Processed {count} commands in {elapsed:.2f} s ({rate:,.0f} commands/sec), {errors} failed.", file=sys.stderr)
+    return count, errors
+
+# Startup work done off the interactive loop: loads the book, then builds its deferred indexes
+class BackgroundLoader:
+    """
+    Loads a book from its storage in a background thread, then finishes the indexes the load left for
+    later (see AddressBook.build_indexes) a few thousand records at a time. The book is not thread-safe,
+    so commands run inside `with loader:`, which waits for the load and then for at most one index step.
+
+    Args:
+        storage (Storage): The storage to load the book from.
+        book (AddressBook): The empty book to fill.
+        step (int): The number of records indexed between two chances for a command to run.
+    """
+
+    def __init__(self, storage: Storage, book: AddressBook, step: int = 10_000):
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._error: Exception | None = None
+        self._thread = threading.Thread(target=self._work, args=(storage, book, step),
+                                        name="addressbook-loader", daemon=True)
+        self._thread.start()
+
+    def _work(self, storage: Storage, book: AddressBook, step: int) -> None:
+        try:
+            with self._lock:
+                storage.load(book)
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            self._loaded.set()
+        while True:
+            with self._lock:
+                if book.build_indexes(step):
+                    return
+            # let a waiting command take the lock before the next step does
+            time.sleep(0)
+
+    def wait(self) -> None:
+        """Wait for the load, and raise the error it failed with."""
+        self._loaded.wait()
+        if self._error is not None:
+            raise self._error
+
+    def join(self) -> None:
+        """Wait for the load to end, successful or not; its error is raised by wait."""
+        self._loaded.wait()
+
+    def __enter__(self) -> "BackgroundLoader":
+        self.wait()
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._lock.release()
+
+def run(book: AddressBook, loader: BackgroundLoader | None = None):
     print("Welcome to the assistant bot!")
     while True:
         user_input = input("Enter a command: ")
         command, *args = parse_input(user_input)
-        if command in ["close", "exit"]:
-            print("Good bye!")
+        with loader or nullcontext():
+            write_reply(router.dispatch(command, args, book), sys.stdout)
+        spec = router.resolve(command)
+        if spec is not None and spec.exits:
             break
-        elif command == "hello":
-            print("How can I help you?")
-        elif command == "add":
-            print(add_contact(args, book))
-        elif command == "change":
-            print(change_contact(args, book))   
-        elif command == "phone":
-            print(show_phone(args, book))
-        elif command == "all":
-            print(show_all(book))  
-        elif command == "add-birthday":
-            print(add_birthday(args, book))  
-        elif command == "show-birthday":
-           print(show_birthday(args, book))  
-        elif command == "birthdays":
-            print(birthdays(book))
-        else:
-            print("Invalid command.")
-    
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
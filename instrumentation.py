@@ -0,0 +1,266 @@
+import io
+import sys
+from time import perf_counter_ns
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pstats
+
+# cProfile, pstats and tracemalloc are imported by the methods using them: together they cost more
+# at startup than the rest of the bot, and most sessions never switch profiling or tracing on
+
+# Latency histograms have one bucket per power of two nanoseconds: bucket b counts the calls
+# that took from 2**(b-1) up to 2**b - 1 ns, so recording a call is one int.bit_length()
+HISTOGRAM_BUCKETS = 48
+
+# Calls and errors are counted exactly, the latency of one call in SAMPLE_EVERY: reading the clock
+# twice costs about 200 ns on a virtual machine, as much as the cheapest commands, so at one in 128
+# the timing adds a couple of nanoseconds to a command on average
+SAMPLE_EVERY = 128
+
+
+class CommandStats:
+    """
+    Counters of one command: calls, failures by error class, and the time spent by the timed calls.
+    Calls are counted in windows starting with a timed call, which adds the whole window to `counted`
+    (see Instrumentation.measure); the other calls of the window only decrement `countdown`.
+    """
+
+    __slots__ = ("counted", "countdown", "timed", "total_ns", "histogram", "errors")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.counted = 0    # calls of the windows started so far
+        self.countdown = 0  # calls left in the current window, the next call is timed at 0
+        self.timed = 0
+        self.total_ns = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+        self.errors: dict[str, int] = {}
+
+    @property
+    def calls(self) -> int:
+        return self.counted - self.countdown
+
+    def add_error(self, error_type: str) -> None:
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def add_time(self, elapsed: int) -> None:
+        self.timed += 1
+        self.total_ns += elapsed
+        bucket = elapsed.bit_length()
+        self.histogram[bucket if bucket < HISTOGRAM_BUCKETS else HISTOGRAM_BUCKETS - 1] += 1
+
+    def percentile_ns(self, share: float) -> int:
+        """Upper bound of the bucket holding the given share of the timed calls, like 0.99 for p99."""
+        rank = share * self.timed
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return (1 << bucket) - 1
+        return 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": dict(self.errors),
+            "timed_calls": self.timed,
+            "mean_us": self.total_ns / self.timed / 1e3 if self.timed else 0.0,
+            "p50_us": self.percentile_ns(0.5) / 1e3,
+            "p99_us": self.percentile_ns(0.99) / 1e3,
+            # bucket upper bounds in ns -> number of calls
+            "histogram_ns": {str((1 << bucket) - 1): count for bucket, count in enumerate(self.histogram) if count},
+        }
+
+
+def _timed_lines(stats: CommandStats, start: int, lines):
+    """Pass a listing through, adding the time until its last line to `stats`."""
+    try:
+        yield from lines
+    finally:
+        stats.add_time(perf_counter_ns() - start)
+
+
+class Instrumentation:
+    """
+    Per-command statistics collected by CommandRouter.dispatch, plus optional captures that can be
+    switched on and off while the bot runs: every Nth command under cProfile, and tracemalloc.
+    Counting is off by default, so a dispatch costs one attribute check until statistics are asked for.
+
+    Args:
+        enabled (bool): Whether commands are counted from the start.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.commands: dict[str, CommandStats] = {}
+        # calls per window, the first call of every window is timed
+        self.sample_every = SAMPLE_EVERY
+        self._profiler = None  # cProfile.Profile collecting the sampled commands
+        self._profile_every = 0
+        self._countdown = 0
+
+    def stats_for(self, name: str) -> CommandStats:
+        """The counters of a command, created on first use and kept across resets."""
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        return stats
+
+    def reset(self) -> None:
+        """Zero the counters and drop the captured profile."""
+        for stats in self.commands.values():
+            stats.clear()
+        self._profiler = None
+        if self._profile_every:
+            import cProfile
+            self._profiler = cProfile.Profile()
+
+    def measure(self, stats: CommandStats, handler, *args):
+        """
+        Start a new window of calls of `stats` with this one: run the command handler and add its time,
+        under cProfile when its turn has come. A listing is timed until it is consumed, only its creation
+        runs under cProfile.
+        """
+        every = self.sample_every
+        stats.counted += every
+        stats.countdown = every - 1
+        if self._profile_every:
+            self._countdown -= 1
+            if self._countdown <= 0:
+                self._countdown = self._profile_every
+                # a reset during the command replaces self._profiler, the one enabled must be the one disabled
+                profiler = self._profiler
+                start = perf_counter_ns()
+                profiler.enable()
+                try:
+                    result = handler(*args)
+                finally:
+                    profiler.disable()
+                return self._timed(stats, start, result)
+        start = perf_counter_ns()
+        return self._timed(stats, start, handler(*args))
+
+    @staticmethod
+    def _timed(stats: CommandStats, start: int, result):
+        if isinstance(result, str):
+            stats.add_time(perf_counter_ns() - start)
+            return result
+        return _timed_lines(stats, start, result)
+
+    def start_profiling(self, every: int = 100) -> None:
+        """
+        Run every `every`-th command under cProfile, adding to the profile captured so far.
+        The profile is taken by dispatch while it counts the commands, so this switches counting on.
+        """
+        if every < 1:
+            raise ValueError("every must be a positive number")
+        self.enabled = True
+        if self._profiler is None:
+            import cProfile
+            self._profiler = cProfile.Profile()
+        self._profile_every = self._countdown = every
+        # the profile is sampled over all commands, so all of them go through measure from the next call on
+        self.sample_every = 1
+        for stats in self.commands.values():
+            stats.counted -= stats.countdown
+            stats.countdown = 0
+
+    def stop_profiling(self) -> None:
+        """Stop sampling; the profile captured so far stays in the report until reset."""
+        self._profile_every = 0
+        self.sample_every = SAMPLE_EVERY
+
+    @property
+    def profiling(self) -> bool:
+        return bool(self._profile_every)
+
+    @staticmethod
+    def start_tracing(frames: int = 1) -> None:
+        """Trace the memory allocations of the whole process until stop_tracing."""
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @staticmethod
+    def stop_tracing() -> None:
+        import tracemalloc
+        tracemalloc.stop()
+
+    def _profile_stats(self, stream=None) -> "pstats.Stats | None":
+        if self._profiler is None:
+            return None
+        import pstats
+        try:
+            return pstats.Stats(self._profiler, stream=stream)
+        except TypeError:  # nothing was profiled yet
+            return None
+
+    def _profile_entries(self, limit: int) -> list[dict]:
+        stats = self._profile_stats()
+        if stats is None:
+            return []
+        entries = []
+        for (file_name, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            entries.append({"function": f"{file_name}:{line}({function})", "calls": calls,
+                            "total_s": total, "cumulative_s": cumulative})
+        entries.sort(key=lambda entry: entry["cumulative_s"], reverse=True)
+        return entries[:limit]
+
+    @staticmethod
+    def _memory(limit: int) -> dict | None:
+        tracemalloc = sys.modules.get("tracemalloc")
+        if tracemalloc is None or not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+        return {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top": [{"line": str(stat.traceback), "bytes": stat.size, "blocks": stat.count} for stat in top],
+        }
+
+    def dump(self, limit: int = 20) -> dict:
+        """
+        Everything collected so far, in a form that serializes to JSON.
+
+        Args:
+            limit (int): The number of profile entries and allocation sites to include.
+        Returns:
+            dict: "enabled", "commands" (name -> counters), "profile" and "memory" (None while not tracing).
+        """
+        return {
+            "enabled": self.enabled,
+            "commands": {name: stats.to_dict() for name, stats in sorted(self.commands.items()) if stats.calls},
+            "profile": self._profile_entries(limit),
+            "memory": self._memory(limit),
+        }
+
+    def report(self, limit: int = 10) -> str:
+        """The counters as a table, followed by the profile and memory captures when there are any."""
+        lines = [f"Statistics are {'on' if self.enabled else 'off'}."]
+        used = sorted((name, stats) for name, stats in self.commands.items() if stats.calls)
+        if used:
+            lines.append(f"{'command':<14}{'calls':>9}{'errors':>8}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+            for name, stats in used:
+                counters = stats.to_dict()
+                lines.append(f"{name:<14}{stats.calls:>9}{sum(stats.errors.values()):>8}{counters['mean_us']:>10.1f}"
+                             f"{counters['p50_us']:>10.1f}{counters['p99_us']:>10.1f}")
+                for error_type, count in sorted(stats.errors.items()):
+                    lines.append(f"  {error_type}: {count}")
+        text = io.StringIO()
+        stats = self._profile_stats(text)
+        if stats is not None:
+            stats.sort_stats("cumulative").print_stats(limit)
+            lines.append(text.getvalue().strip())
+        memory = self._memory(limit)
+        if memory is not None:
+            lines.append(f"Memory: {memory['current_bytes']:,} bytes now, {memory['peak_bytes']:,} at peak")
+            lines.extend(f"  {site['bytes']:>12,} {site['line']}" for site in memory["top"])
+        return "\n".join(lines)
+
+
+# Statistics of the bot commands, shared by every driver in the process
+instruments = Instrumentation()
@@ -0,0 +1,210 @@
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from datetime import date
+
+from contacts import Phone, Record
+from contacts.dictbook import _upcoming_birthdays
+from contacts.fields import _pack_phone
+
+# File layout, all integers little-endian:
+#   header          - magic, record count, name width, section offsets
+#   records         - fixed-width slots sorted by the UTF-8 name:
+#                     name (NUL-padded), birthday ordinal (0 - not set), first phone, phone count
+#   phone list      - the phones of every record (uint64), in record order; a record's are
+#                     the `phone count` entries starting at its `first phone`
+#   phone index     - (phone, record number) pairs sorted by phone
+#   birthday table  - 367 uint32 bounds into the birthday list, one bucket per day of a leap year
+#   birthday list   - record numbers grouped by birthday bucket, each group sorted by name
+# Every lookup is a binary search or a slice over the mapped pages, so many processes opening the
+# same file share one copy of it in the page cache and nothing is loaded until it is touched.
+
+MAGIC = b"ABM2"
+HEADER = struct.Struct("<4sIHQQQQQ")  # magic, count, name width, records/phone list/phone index/table/list offsets
+PHONE_ENTRY = struct.Struct("<QI")     # phone, record number
+UINT32 = struct.Struct("<I")
+BUCKETS = 366
+
+# First bucket of every month in a leap year, so Feb 29 gets a bucket of its own
+_MONTH_START = [0] + [date(2000, month, 1).toordinal() - date(2000, 1, 1).toordinal() for month in range(1, 13)]
+
+def _bucket(month: int, day: int) -> int:
+    return _MONTH_START[month] + day - 1
+
+
+def write_mapped_book(book: Mapping, path: str) -> None:
+    """
+    Write a book to the file read by MappedAddressBook.
+
+    Args:
+        book (Mapping[str, Record]): The book to write, usually an AddressBook.
+        path (str): Destination file, replaced atomically.
+    """
+    records = sorted(book.values(), key=lambda record: record.name.value.encode("utf-8"))
+    names = [record.name.value.encode("utf-8") for record in records]
+    name_width = max((len(name) for name in names), default=1)
+    record_format = struct.Struct(f"<{name_width}sIII")
+
+    phone_entries = []
+    buckets = [[] for _ in range(BUCKETS)]
+    for number, record in enumerate(records):
+        for packed in record._phones:
+            phone_entries.append((packed, number))
+        if record._birthday:
+            birthday = date.fromordinal(record._birthday)
+            buckets[_bucket(birthday.month, birthday.day)].append(number)
+    phone_entries.sort()
+
+    records_offset = HEADER.size
+    phone_list_offset = records_offset + record_format.size * len(records)
+    phones_offset = phone_list_offset + 8 * len(phone_entries)
+    table_offset = phones_offset + PHONE_ENTRY.size * len(phone_entries)
+    list_offset = table_offset + UINT32.size * (BUCKETS + 1)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(records), name_width,
+                               records_offset, phone_list_offset, phones_offset, table_offset, list_offset))
+        first_phone = 0
+        for name, record in zip(names, records):
+            file.write(record_format.pack(name, record._birthday, first_phone, len(record._phones)))
+            first_phone += len(record._phones)
+        for record in records:
+            file.write(struct.pack(f"<{len(record._phones)}Q", *record._phones))
+        for entry in phone_entries:
+            file.write(PHONE_ENTRY.pack(*entry))
+        bound = 0
+        file.write(UINT32.pack(bound))
+        for bucket in buckets:
+            bound += len(bucket)
+            file.write(UINT32.pack(bound))
+        for bucket in buckets:
+            # records are already sorted by name, so every bucket is too
+            file.write(struct.pack(f"<{len(bucket)}I", *bucket))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+class MappedAddressBook(Mapping):
+    """
+    Read-only address book served straight from a file written by write_mapped_book.
+    It answers the same queries as AddressBook with the same return shapes; records are built
+    on access and are detached copies, changing them does not change the file.
+
+    Args:
+        path (str): The file to map.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self._count, self._name_width, self._records_offset, self._phone_list_offset,
+         self._phones_offset, self._table_offset, self._list_offset) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a mapped address book.")
+        self._record_format = struct.Struct(f"<{self._name_width}sIII")
+        self._phone_count = (self._table_offset - self._phones_offset) // PHONE_ENTRY.size
+
+    # the CLI handlers look at book.data, which is the mapping itself here
+    @property
+    def data(self) -> "MappedAddressBook":
+        return self
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _name_at(self, number: int) -> bytes:
+        offset = self._records_offset + number * self._record_format.size
+        return self._map[offset:offset + self._name_width].rstrip(b"\0")
+
+    def _record_at(self, number: int) -> Record:
+        name, birthday, first_phone, phone_count = self._record_format.unpack_from(
+            self._map, self._records_offset + number * self._record_format.size)
+        phones = struct.unpack_from(f"<{phone_count}Q", self._map, self._phone_list_offset + 8 * first_phone)
+        return Record._from_packed(name.rstrip(b"\0").decode("utf-8"), phones, birthday)
+
+    def _find_number(self, name: str) -> int | None:
+        """Binary search of a name among the sorted records."""
+        key = name.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._name_at(low) == key:
+            return low
+        return None
+
+    def __getitem__(self, name: str) -> Record:
+        number = self._find_number(name) if isinstance(name, str) else None
+        if number is None:
+            raise KeyError(name)
+        return self._record_at(number)
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and self._find_number(name) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        for number in range(self._count):
+            yield self._name_at(number).decode("utf-8")
+
+    def values(self):
+        for number in range(self._count):
+            yield self._record_at(number)
+
+    def items(self):
+        for number in range(self._count):
+            record = self._record_at(number)
+            yield record.name.value, record
+
+    def find(self, name: str) -> Record | None:
+        """Find a Record by name. Returns None if not found."""
+        number = self._find_number(name)
+        return None if number is None else self._record_at(number)
+
+    def find_by_phone(self, phone_number: str) -> Record | None:
+        """Find the Record owning a phone number. Returns None if not found."""
+        if not Phone.is_valid(phone_number):
+            return None
+        key = _pack_phone(phone_number)
+        low, high = 0, self._phone_count
+        while low < high:
+            middle = (low + high) // 2
+            phone, _ = PHONE_ENTRY.unpack_from(self._map, self._phones_offset + middle * PHONE_ENTRY.size)
+            if phone < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._phone_count:
+            phone, number = PHONE_ENTRY.unpack_from(self._map, self._phones_offset + low * PHONE_ENTRY.size)
+            if phone == key:
+                return self._record_at(number)
+        return None
+
+    def _names_born_on(self, key: tuple[int, int]) -> list[str]:
+        bucket = _bucket(*key)
+        start, end = struct.unpack_from("<2I", self._map, self._table_offset + bucket * UINT32.size)
+        numbers = struct.unpack_from(f"<{end - start}I", self._map, self._list_offset + start * UINT32.size)
+        return [self._name_at(number).decode("utf-8") for number in numbers]
+
+    def get_upcoming_birthdays(self, days: int = 7, today: date | None = None) -> list[dict[str,str]]:
+        """Same as AddressBook.get_upcoming_birthdays, reading only the birthday buckets of the window."""
+        return _upcoming_birthdays(self._names_born_on, days, today)
+
+    def iter_lines(self, offset: int = 0, limit: int | None = None):
+        """Same as AddressBook.iter_lines, records are read from the file only when their line is rendered."""
+        stop = self._count if limit is None else min(self._count, offset + limit)
+        for number in range(offset, stop):
+            yield str(self._record_at(number))
+
+    def __str__(self):
+        if not self._count:
+            return "Address book is empty."
+        return "\n".join(self.iter_lines())
@@ -0,0 +1,148 @@
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import date
+from time import monotonic
+
+# What a cached reply depends on, given when a command is registered, see CommandRouter.command
+CONTACT = "contact"  # the contact named by the first argument
+BOOK = "book"        # the whole book
+TODAY = "today"      # the whole book and the current date
+
+
+class CacheStats:
+    """Counters of a ResultCache."""
+
+    __slots__ = ("hits", "misses", "evictions", "invalidations", "expirations")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0      # entries dropped to make room, least recently used first
+        self.invalidations = 0  # entries found stale after a change of the book or a new day
+        self.expirations = 0    # entries found older than the time to live
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "expirations": self.expirations,
+        }
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of the replies of read-only commands, keyed by the command and its arguments.
+
+    Every entry keeps a version of what its reply was computed from: the version counter of the contact
+    (see Record._version) or of the whole book, plus the date for replies about the days ahead.
+    A lookup compares it with the current one, so a change invalidates exactly the replies depending on it,
+    without the book having to know about the cache. Long listings are streamed to the caller
+    and only kept when they have at most `max_lines` lines.
+
+    Args:
+        maxsize (int): The most entries kept.
+        ttl (float | None): Seconds an entry stays valid, None for as long as what it depends on.
+        max_lines (int): The longest listing kept.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, max_lines: int = 1000):
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive number")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_lines = max_lines
+        self.stats = CacheStats()
+        # the server answers whole-book reads on worker threads, lookups and stores are made one at a time
+        self._lock = threading.Lock()
+        # (command, arguments) -> (weak reference to the book, version, expiry time, reply)
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _version(depends_on: str, args, book):
+        if depends_on == CONTACT:
+            return book._contact_version(args[0])
+        if depends_on == TODAY:
+            return book._version, date.today()
+        return book._version
+
+    def call(self, name: str, depends_on: str, handler, args, book):
+        """
+        Return the cached reply of a command, or run its handler and keep the reply.
+
+        Args:
+            name (str): The command name, part of the key.
+            depends_on (str): CONTACT, BOOK or TODAY.
+            handler (callable): The command handler, called as handler(args, book).
+            args (Sequence[str]): The command arguments, part of the key.
+            book (DictAddressBook): The book the command works on.
+        Returns:
+            str | Iterable[str]: The reply, see write_reply.
+        """
+        key = (name, tuple(args))
+        version = self._version(depends_on, args, book)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                book_ref, entry_version, expires, reply = entry
+                if book_ref() is not book or entry_version != version:
+                    self.stats.invalidations += 1
+                    del self._entries[key]
+                elif expires is not None and expires <= monotonic():
+                    self.stats.expirations += 1
+                    del self._entries[key]
+                else:
+                    self.stats.hits += 1
+                    self._entries.move_to_end(key)
+                    return reply if reply.__class__ is not tuple else iter(reply)
+            self.stats.misses += 1
+        reply = handler(args, book)
+        if isinstance(reply, str):
+            self._store(key, book, version, reply)
+            return reply
+        return self._keep_lines(key, book, version, reply)
+
+    def _keep_lines(self, key: tuple, book, version, lines):
+        """Pass a listing through, keeping it once it is complete unless it is too long."""
+        kept = []
+        for line in lines:
+            if kept is not None:
+                kept.append(line)
+                if len(kept) > self.max_lines:
+                    kept = None
+            yield line
+        if kept is not None:
+            self._store(key, book, version, tuple(kept))
+
+    def _store(self, key: tuple, book, version, reply) -> None:
+        expires = None if self.ttl is None else monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (weakref.ref(book), version, expires, reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+
+    def dump(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl, **self.stats.to_dict()}
+
+    def report(self) -> str:
+        counters = self.stats.to_dict()
+        return (f"Result cache: {len(self._entries)}/{self.maxsize} entries, {counters['hits']} hits, "
+                f"{counters['misses']} misses ({counters['hit_rate']:.0%} hit rate), {counters['evictions']} evictions, "
+                f"{counters['invalidations']} invalidations, {counters['expirations']} expirations.")
@@ -0,0 +1,163 @@
+import argparse
+import os
+from datetime import date, datetime, timedelta
+
+from contacts import AddressBook, Birthday, Record
+from contacts.dictbook import _isleap, _upcoming_birthdays
+from contacts.storage import Storage
+from hometask2 import DATA_DIR
+
+
+def _due_keys(day: date) -> list[tuple[int, int]]:
+    """
+    The (month, day) birthday keys congratulated on a day: nothing on weekends, the weekend birthdays
+    on Mondays, and Feb 29 together with March 1 in non-leap years.
+    """
+    if day.weekday() >= 5:
+        return []
+    occurrences = [day]
+    if day.weekday() == 0:
+        occurrences += [day - timedelta(days=1), day - timedelta(days=2)]
+    keys = []
+    for occurrence in occurrences:
+        keys.append((occurrence.month, occurrence.day))
+        if keys[-1] == (3, 1) and not _isleap(occurrence.year):
+            keys.append((2, 29))
+    return keys
+
+
+# Congratulations due on one day, handed to the scheduler callbacks
+class BirthdayEvent:
+    __slots__ = ("day", "names", "late")
+
+    def __init__(self, day: date, names: list[str], late: bool = False):
+        self.day = day
+        self.names = names
+        self.late = late  # True for a birthday added after the events of its day had fired
+
+    def __repr__(self) -> str:
+        return f"BirthdayEvent({self.day:%d.%m.%Y}, {self.names!r}{', late' if self.late else ''})"
+
+
+class BirthdayScheduler:
+    """
+    Birthday notifications over an AddressBook, driven by the birthday index the book keeps up to date
+    on every change: the index is the timeline, one bucket per day of the year. Finding who is due on a
+    day reads at most four buckets, so a daily job costs O(matches) whatever the book size.
+
+    advance() moves the scheduler day by day to a date, firing an event for every day with congratulations
+    due. A birthday added or changed later that is due on the last fired day fires a late event at once.
+    Callbacks run inside the change, under the locks of a ConcurrentAddressBook, so they must be quick.
+
+    Args:
+        book (AddressBook): The book to watch.
+        last_day (date | None): The last day whose events already fired, None if none did.
+    """
+
+    def __init__(self, book: AddressBook, last_day: date | None = None):
+        self.book = book
+        self.last_day = last_day
+        self._callbacks: list = []
+        self._due_today: set[tuple[int, int]] = set(_due_keys(last_day)) if last_day else set()
+        self._announced: set[str] = set(self.due_on(last_day)) if last_day else set()
+        book._birthday_listeners.append(self._birthday_indexed)
+
+    def close(self) -> None:
+        """Stop watching the book."""
+        self.book._birthday_listeners.remove(self._birthday_indexed)
+
+    def subscribe(self, callback) -> None:
+        """Call `callback(event)` with every BirthdayEvent fired from now on."""
+        self._callbacks.append(callback)
+
+    def _names_born_on(self, key: tuple[int, int]):
+        # a copy, so a writer changing the bucket cannot break the walk; a ConcurrentAddressBook makes it under its lock
+        return tuple(self.book._born_on(key))
+
+    def due_on(self, day: date) -> list[str]:
+        """The names congratulated on a day, sorted."""
+        return sorted(name for key in _due_keys(day) for name in self._names_born_on(key))
+
+    def upcoming(self, from_date: date | None = None, days: int = 7) -> list[dict[str, str]]:
+        """
+        Same as AddressBook.get_upcoming_birthdays for any window, in the past or in the future.
+
+        Args:
+            from_date (date | None): The first day of the window (defaults to the day after the last fired day,
+                                     or to the current date when no day fired yet).
+            days (int): Size of the window in days, from_date included.
+        """
+        if from_date is None:
+            from_date = self.last_day + timedelta(days=1) if self.last_day else datetime.today().date()
+        return _upcoming_birthdays(self._names_born_on, days, from_date)
+
+    def advance(self, to_date: date | None = None) -> list[BirthdayEvent]:
+        """
+        Fire the events of every day after the last fired one up to `to_date` included.
+        A scheduler that never fired starts at `to_date`.
+
+        Args:
+            to_date (date | None): The day to move to (defaults to the current date).
+        Returns:
+            list[BirthdayEvent]: The events fired, one per day with congratulations due.
+        """
+        to_date = to_date or datetime.today().date()
+        day = self.last_day + timedelta(days=1) if self.last_day else to_date
+        events = []
+        while day <= to_date:
+            names = self.due_on(day)
+            self.last_day = day
+            self._due_today = set(_due_keys(day))
+            self._announced = set(names)
+            if names:
+                event = BirthdayEvent(day, names)
+                events.append(event)
+                self._fire(event)
+            day += timedelta(days=1)
+        return events
+
+    def _fire(self, event: BirthdayEvent) -> None:
+        for callback in self._callbacks:
+            callback(event)
+
+    def _birthday_indexed(self, record: Record) -> None:
+        name = record.name.value
+        if name in self._announced:
+            return
+        birthday = date.fromordinal(record._birthday)
+        if (birthday.month, birthday.day) in self._due_today:
+            self._announced.add(name)
+            self._fire(BirthdayEvent(self.last_day, [name], late=True))
+
+
+# Daily job: remembers the last day it ran in the data directory and catches up on missed days
+LAST_DAY_FILE = "scheduler-last-day.txt"
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the birthday congratulations due since the last run.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory where the address book is stored")
+    parser.add_argument("--date", help="run as if today were DD.MM.YYYY")
+    parser.add_argument("--days", type=int, default=7, help="also list the birthdays of the next DAYS days")
+    args = parser.parse_args()
+
+    today = Birthday(args.date).value if args.date else datetime.today().date()
+    state_path = os.path.join(args.data_dir, LAST_DAY_FILE)
+    last_day = None
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as file:
+            last_day = Birthday.try_parse(file.read().strip())
+
+    # the bot or the server may have the book open: read it without taking the storage over
+    book = Storage(args.data_dir).read(AddressBook())
+    scheduler = BirthdayScheduler(book, last_day)
+    scheduler.subscribe(lambda event: print(f"{event.day:%d.%m.%Y}: congratulate {', '.join(event.names)}"))
+    scheduler.advance(today)
+    for user in scheduler.upcoming(today + timedelta(days=1), args.days):
+        print(f"Upcoming birthday for {user['name']} on {user['congratulation_date']}.")
+    os.makedirs(args.data_dir, exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as file:
+        file.write(f"{scheduler.last_day:%d.%m.%Y}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import gc
+import random
+import signal
+import sys
+import time
+
+from concurrentbook import ConcurrentAddressBook
+from contacts import AddressBook
+from contacts.storage import Storage, StorageError
+from hometask2 import DATA_DIR, ErrorMessage, parse_input, router
+from resultcache import BOOK, TODAY
+
+# Line protocol: a client sends one command per line; every reply is sent as a line with the
+# number of reply lines, followed by those lines. The connection is closed after "exit".
+
+
+def _frame(reply) -> bytes:
+    """Encode a reply for the line protocol: a listing is sent whole, since the reply starts with its line count."""
+    lines = reply.split("\n") if isinstance(reply, str) else list(reply)
+    return f"{len(lines)}\n{chr(10).join(lines)}\n".encode("utf-8")
+
+
+class BookServer:
+    """
+    Serves the bot commands of one shared AddressBook over TCP.
+
+    Reads of one contact are answered straight away on the event loop. Reads of the whole book (all, birthdays)
+    run on worker threads when the book is a ConcurrentAddressBook, so that they do not hold up the other
+    clients. Writes go through one queue drained by a single writer task, which applies a whole batch
+    and then syncs the journal once for it (group commit).
+    A client's next command is read only after the reply to the previous one is written and drained,
+    so slow clients and a full write queue push back on their senders instead of buffering without limit.
+
+    Args:
+        book (AddressBook): The shared book.
+        storage (Storage | None): The storage of the book, synced after every write batch.
+        max_clients (int): Connections served at once, the next ones wait for a free slot.
+        max_queued_writes (int): Writes waiting for the writer task before senders are paused.
+    """
+
+    def __init__(self, book: AddressBook, storage: Storage | None = None, max_clients: int = 10_000,
+                 max_queued_writes: int = 1024):
+        self.book = book
+        self.storage = storage
+        self._slots = asyncio.Semaphore(max_clients)
+        self._writes: asyncio.Queue = asyncio.Queue(max_queued_writes)
+        self._writer_task: asyncio.Task | None = None
+        # replies computed from the whole book take time, a thread-safe book lets them run off the event loop
+        self._offload_reads = isinstance(book, ConcurrentAddressBook)
+        self._clients: dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def serve(self, host: str, port: int) -> None:
+        """Serve until SIGINT or SIGTERM, then stop the writer task; the caller closes the storage."""
+        self._writer_task = asyncio.create_task(self._apply_writes())
+        server = await asyncio.start_server(self._handle_client, host, port, limit=64 * 1024)
+        async with server:
+            print(f"Serving the address book on {host}:{port}")
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(signum, stop.set)
+                except NotImplementedError:  # Windows: Ctrl+C still raises KeyboardInterrupt
+                    pass
+            try:
+                await stop.wait()
+            finally:
+                self._writer_task.cancel()
+                # the connections are closed here, so that their handlers end before the server closes
+                for writer in self._clients:
+                    writer.close()
+                if self._clients:
+                    await asyncio.wait(list(self._clients.values()), timeout=1)
+
+    async def _apply_writes(self) -> None:
+        while True:
+            batch = [await self._writes.get()]
+            while not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+            # a failing command (e.g. the journal out of disk space) fails its own reply, not the writer task
+            results = []
+            for command, args, reply in batch:
+                try:
+                    results.append((reply, router.dispatch(command, args, self.book), None))
+                except Exception as e:
+                    results.append((reply, None, e))
+            if self.storage is not None:
+                try:
+                    self.storage.sync()
+                except OSError as e:
+                    # nothing of the batch is durable, so none of it is acknowledged
+                    results = [(reply, None, error or e) for reply, _, error in results]
+            for reply, result, error in results:
+                if reply.cancelled():  # the client is gone
+                    continue
+                if error is None:
+                    reply.set_result(result)
+                else:
+                    reply.set_exception(error)
+
+    async def _execute(self, command: str, args: list[str]) -> bytes:
+        """Run a command and return its reply as sent to the client."""
+        spec = router.resolve(command)
+        if spec is not None and spec.mutates:
+            reply = asyncio.get_running_loop().create_future()
+            await self._writes.put((command, args, reply))
+            return _frame(await reply)
+        if self._offload_reads and spec is not None and spec.cached in (BOOK, TODAY):
+            # the listing is built and encoded on the worker thread as well
+            return await asyncio.get_running_loop().run_in_executor(None, self._read, command, args)
+        return _frame(router.dispatch(command, args, self.book))
+
+    def _read(self, command: str, args: list[str]) -> bytes:
+        return _frame(router.dispatch(command, args, self.book))
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async with self._slots:
+            self._clients[writer] = asyncio.current_task()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    command, *args = parse_input(line.decode("utf-8", "replace"))
+                    if not command:
+                        continue
+                    try:
+                        payload = await self._execute(command, args)
+                    except Exception as e:
+                        payload = _frame(ErrorMessage(f"The command failed: {e}", type(e).__name__))
+                    writer.write(payload)
+                    await writer.drain()
+                    spec = router.resolve(command)
+                    if spec is not None and spec.exits:
+                        break
+            except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                pass
+            finally:
+                del self._clients[writer]
+                writer.close()
+
+
+async def send_command(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, line: str) -> str:
+    """Send one command and return its reply."""
+    writer.write(line.encode("utf-8") + b"\n")
+    await writer.drain()
+    count = int(await reader.readline())
+    return "\n".join([(await reader.readline()).decode("utf-8").rstrip("\n") for _ in range(count)])
+
+
+async def load_test(host: str, port: int, clients: int, requests: int, write_share: float) -> None:
+    """
+    Open `clients` connections that each send `requests` commands one after another and report
+    the latency percentiles and the overall throughput. `write_share` of the commands are "add",
+    the rest are "phone" and "find-phone" lookups.
+    """
+    latencies: list[float] = []
+
+    async def client(number: int) -> None:
+        rnd = random.Random(number)
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            name = f"load{number}"
+            await send_command(reader, writer, f"add {name} {rnd.randrange(10**10):010d}")
+            for _ in range(requests):
+                if rnd.random() < write_share:
+                    line = f"add {name} {rnd.randrange(10**10):010d}"
+                elif rnd.random() < 0.5:
+                    line = f"phone load{rnd.randrange(clients)}"
+                else:
+                    line = f"find-phone {rnd.randrange(10**10):010d}"
+                start = time.perf_counter()
+                await send_command(reader, writer, line)
+                latencies.append(time.perf_counter() - start)
+            await send_command(reader, writer, "exit")
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000
+    print(f"{clients} clients, {len(latencies)} requests in {elapsed:.2f} s: {len(latencies) / elapsed:,.0f} requests/sec, "
+          f"p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Address book server and its load generator.")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    serve = subparsers.add_parser("serve", help="run the server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--data-dir", default=DATA_DIR, help="directory where the address book is stored")
+    serve.add_argument("--max-clients", type=int, default=10_000)
+    load = subparsers.add_parser("load", help="run the load generator against a server")
+    load.add_argument("--host", default="127.0.0.1")
+    load.add_argument("--port", type=int, default=8765)
+    load.add_argument("--clients", type=int, default=1000)
+    load.add_argument("--requests", type=int, default=100, help="requests sent by every client")
+    load.add_argument("--write-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        # the writer task syncs the journal after every batch, so the storage never syncs on its own
+        storage = Storage(args.data_dir, sync_every=10**12)
+        try:
+            book = storage.load(ConcurrentAddressBook())
+        except StorageError as e:
+            sys.exit(str(e))
+        # the loaded records live as long as the server: full collections, which stop every thread,
+        # no longer walk them
+        gc.freeze()
+        try:
+            asyncio.run(BookServer(book, storage, args.max_clients).serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            storage.close()
+    else:
+        asyncio.run(load_test(args.host, args.port, args.clients, args.requests, args.write_share))
+
+
+if __name__ == "__main__":
+    main()
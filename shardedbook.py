@@ -0,0 +1,247 @@
+import heapq
+from array import array
+import multiprocessing
+import zlib
+from datetime import date, datetime
+from itertools import islice
+
+from contacts import AddressBook, Phone, Record, UserValueError
+
+
+class _Shard:
+    """The part of a ShardedAddressBook living in one worker process. Every method returns plain data."""
+
+    def __init__(self):
+        self.book = AddressBook()
+
+    def restore(self, rows: list[tuple[str, bytes, int]]) -> None:
+        self.book._restore_records((name, _phones_from_bytes(phones), birthday) for name, phones, birthday in rows)
+
+    def find(self, name: str) -> tuple[str, bytes, int] | None:
+        record = self.book.find(name)
+        return None if record is None else _pack_record(record)
+
+    def find_by_phone(self, phone_number: str) -> tuple[str, bytes, int] | None:
+        record = self.book.find_by_phone(phone_number)
+        return None if record is None else _pack_record(record)
+
+    def delete(self, name: str) -> bool:
+        return self.book.delete(name)
+
+    def upcoming_birthdays(self, days: int, today: date) -> list[dict[str, str]]:
+        return self.book.get_upcoming_birthdays(days, today)
+
+    def render(self, offset: int, limit: int) -> list[str]:
+        return list(self.book.iter_lines(offset, limit))
+
+    def size(self) -> int:
+        return len(self.book)
+
+    def import_fields(self, rows: list[tuple[int, tuple[str, list[str], str]]]) -> list[tuple[int, str]]:
+        errors, valid = [], []
+        for number, fields in rows:
+            try:
+                valid.append(AddressBook._validate_fields(*fields))
+            except UserValueError as e:
+                errors.append((number, str(e)))
+            except (TypeError, ValueError, AttributeError):
+                errors.append((number, f"Malformed row: {fields!r}"))
+        self.book._merge_rows(valid)
+        return errors
+
+
+# Records cross the process boundary packed: name, phones as raw uint64 bytes, birthday ordinal
+def _pack_record(record: Record) -> tuple[str, bytes, int]:
+    return record.name.value, record._phones.tobytes(), record._birthday
+
+def _phones_from_bytes(phones: bytes):
+    return memoryview(phones).cast("Q")
+
+def _unpack_record(packed: tuple[str, bytes, int]) -> Record:
+    name, phones, birthday = packed
+    return Record._from_packed(name, _phones_from_bytes(phones), birthday)
+
+
+def _serve_shard(connection) -> None:
+    """Worker process loop: run the requested _Shard methods until the connection is closed."""
+    shard = _Shard()
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        method, args = request
+        try:
+            connection.send((True, getattr(shard, method)(*args)))
+        except Exception as e:
+            connection.send((False, e))
+
+
+class ShardedAddressBook:
+    """
+    Address book split over worker processes by a hash of the name, so that full-book work
+    (upcoming birthdays, phone lookups, bulk imports) runs on all cores at once.
+    Every shard gets its request before any reply is awaited, and the replies are merged into
+    the shapes AddressBook returns. Records returned by it are detached copies.
+
+    Args:
+        shards (int): Number of worker processes, the number of CPUs by default.
+    """
+
+    def __init__(self, shards: int | None = None):
+        count = shards or multiprocessing.cpu_count()
+        self._connections = []
+        self._workers = []
+        for _ in range(count):
+            parent, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_serve_shard, args=(child,), daemon=True)
+            worker.start()
+            child.close()
+            self._connections.append(parent)
+            self._workers.append(worker)
+
+    def close(self) -> None:
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self) -> "ShardedAddressBook":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _shard_of(self, name: str) -> int:
+        # crc32 instead of hash(): it does not change between processes and runs
+        return zlib.crc32(name.encode("utf-8")) % len(self._connections)
+
+    @staticmethod
+    def _reply(connection):
+        ok, result = connection.recv()
+        if not ok:
+            raise result
+        return result
+
+    @staticmethod
+    def _gather(connections) -> list:
+        """Receive the reply of every connection, then raise the first error among them, so none is left unread."""
+        replies = [connection.recv() for connection in connections]
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    def _call(self, shard: int, method: str, *args):
+        self._connections[shard].send((method, args))
+        return self._reply(self._connections[shard])
+
+    def _scatter(self, method: str, *args) -> list:
+        """Send a request to every shard, then gather the replies in shard order."""
+        for connection in self._connections:
+            connection.send((method, args))
+        return self._gather(self._connections)
+
+    def _restore_records(self, rows, batch_size: int = 10_000) -> None:
+        """Bulk load (name, packed phones, birthday ordinal) rows, sending every shard its rows in batches."""
+        batches = [[] for _ in self._connections]
+        for name, phones, birthday in rows:
+            shard = self._shard_of(name)
+            batches[shard].append((name, array("Q", phones).tobytes(), birthday))
+            if len(batches[shard]) >= batch_size:
+                self._call(shard, "restore", batches[shard])
+                batches[shard] = []
+        for shard, batch in enumerate(batches):
+            if batch:
+                self._connections[shard].send(("restore", (batch,)))
+        self._gather([self._connections[shard] for shard, batch in enumerate(batches) if batch])
+
+    def add_record(self, record: Record) -> None:
+        """Adds a Record to the address book. If a record with the same name exists, it overwrites it."""
+        self._restore_records([_pack_record(record)])
+
+    def find(self, name: str) -> Record | None:
+        """Find a Record by name. Returns None if not found."""
+        packed = self._call(self._shard_of(name), "find", name)
+        return None if packed is None else _unpack_record(packed)
+
+    def delete(self, name: str) -> bool:
+        """Delete a Record by name."""
+        return self._call(self._shard_of(name), "delete", name)
+
+    def find_by_phone(self, phone_number: str) -> Record | None:
+        """Find the Record owning a phone number, asking all shards at once. Returns None if not found."""
+        if not Phone.is_valid(phone_number):
+            return None
+        for packed in self._scatter("find_by_phone", phone_number):
+            if packed is not None:
+                return _unpack_record(packed)
+        return None
+
+    def get_upcoming_birthdays(self, days: int = 7, today: date | None = None) -> list[dict[str,str]]:
+        """Same as AddressBook.get_upcoming_birthdays, computed by all shards at once and merged."""
+        # the date is fixed here, so shards running around midnight still agree on it
+        today = today or datetime.today().date()
+
+        def order(item: dict[str, str]) -> tuple[str, str, str, str]:
+            congratulation = item["congratulation_date"]
+            return congratulation[6:], congratulation[3:5], congratulation[:2], item["name"]
+
+        return list(heapq.merge(*self._scatter("upcoming_birthdays", days, today), key=order))
+
+    def import_stream(self, lines, fmt: str = "csv", batch_size: int = 10_000):
+        """
+        Same as AddressBook.import_stream, with rows validated and merged by the shards in parallel.
+
+        Yields:
+            tuple[int, str]: The row number and the error of each rejected row, in row order within a batch.
+        """
+        rows = AddressBook._read_rows(lines, fmt)
+        number = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            errors = []
+            per_shard = [[] for _ in self._connections]
+            for row in batch:
+                number += 1
+                try:
+                    fields = AddressBook._split_row(row, fmt)
+                    # a row without a usable name goes to shard 0, which reports it
+                    name = fields[0].strip() if isinstance(fields[0], str) else ""
+                    per_shard[self._shard_of(name)].append((number, fields))
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    errors.append((number, f"Malformed row: {row!r}"))
+            for shard, rows_of_shard in enumerate(per_shard):
+                self._connections[shard].send(("import_fields", (rows_of_shard,)))
+            for shard_errors in self._gather(self._connections):
+                errors.extend(shard_errors)
+            yield from sorted(errors)
+
+    def __len__(self) -> int:
+        return sum(self._scatter("size"))
+
+    def iter_lines(self, offset: int = 0, limit: int | None = None, page: int = 10_000):
+        """Same as AddressBook.iter_lines, shard after shard, fetching `page` lines at a time."""
+        remaining = limit
+        for shard, size in enumerate(self._scatter("size")):
+            while offset < size and remaining != 0:
+                lines = self._call(shard, "render", offset, page if remaining is None else min(page, remaining))
+                if not lines:
+                    break
+                yield from lines
+                offset += len(lines)
+                if remaining is not None:
+                    remaining -= len(lines)
+            if remaining == 0:
+                return
+            offset = max(0, offset - size)
+
+    def __str__(self):
+        if not len(self):
+            return "Address book is empty."
+        return "\n".join(self.iter_lines())
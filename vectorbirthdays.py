@@ -0,0 +1,117 @@
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # the engine is optional, AddressBook.get_upcoming_birthdays works without it
+    np = None
+
+from contacts.dictbook import _isleap
+
+# The birthdays are kept as the day of a leap year (Jan 1 is 0, Feb 29 is 59). In other years every day
+# from March on comes one day earlier, Feb 29 included, which puts it on March 1.
+_LEAP_MARCH = 60
+
+
+def _leap_day(month: int, day: int) -> int:
+    return date(2000, month, day).timetuple().tm_yday - 1
+
+
+class BirthdayColumns:
+    """
+    Column copy of the birthdays of a book for NumPy: the names sorted, with the day of the year of each
+    birthday beside them. get_upcoming_birthdays computes the days until every birthday, the Feb 29 rule and
+    the weekend shift as array operations and builds result dicts only for the matches. It answers exactly
+    like AddressBook.get_upcoming_birthdays: the book tells the columns which contacts entered or left its
+    birthday index, and the next query updates the rows of just those contacts.
+
+    Args:
+        book (AddressBook): The book to copy the birthdays from.
+    """
+
+    # more changed contacts than this share of the columns are applied by copying all the birthdays again
+    REFRESH_SHARE = 0.1
+
+    def __init__(self, book):
+        if np is None:
+            raise ImportError("BirthdayColumns needs NumPy, install it with `pip install numpy`.")
+        self._book = book
+        self._changed: set[str] = set()
+        book._birthday_index_listeners.append(self._changed.add)
+        self.refresh()
+
+    def close(self) -> None:
+        """Stop following the changes of the book."""
+        self._book._birthday_index_listeners.remove(self._changed.add)
+
+    def refresh(self) -> None:
+        """Copy all the birthdays of the book again."""
+        self._changed.clear()
+        # the birthday index already has the (month, day) of every contact with a birthday
+        born = sorted((name, month, day) for (month, day), bucket in self._book._birthdays.items() for name in bucket)
+        self._names = np.array([name for name, _, _ in born], dtype=object)
+        self._leap_days = np.array([_leap_day(month, day) for _, month, day in born], dtype=np.int32)
+        self._common_days = self._leap_days - (self._leap_days >= _LEAP_MARCH)
+
+    def _apply_changes(self) -> None:
+        """Replace the rows of the contacts whose birthday changed since the last query, keeping the names sorted."""
+        if len(self._changed) > len(self._names) * self.REFRESH_SHARE:
+            self.refresh()
+            return
+        changed = np.array(sorted(self._changed), dtype=object)
+        self._changed.clear()
+        # drop the current rows of the changed names
+        positions = np.searchsorted(self._names, changed)
+        inside = positions < len(self._names)
+        found = np.zeros(len(changed), dtype=bool)
+        found[inside] = self._names[positions[inside]] == changed[inside]
+        names = np.delete(self._names, positions[found])
+        leap_days = np.delete(self._leap_days, positions[found])
+        # then insert those still born on some day, in name order
+        data = self._book.data
+        born = []
+        for name in changed.tolist():
+            record = data.get(name)
+            if record is not None and record._birthday:
+                birthday = date.fromordinal(record._birthday)
+                born.append((name, _leap_day(birthday.month, birthday.day)))
+        added = np.array([name for name, _ in born], dtype=object)
+        at = np.searchsorted(names, added)
+        self._names = np.insert(names, at, added)
+        self._leap_days = np.insert(leap_days, at, np.array([day for _, day in born], dtype=np.int32))
+        self._common_days = self._leap_days - (self._leap_days >= _LEAP_MARCH)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _days_of(self, year: int):
+        return self._leap_days if _isleap(year) else self._common_days
+
+    def get_upcoming_birthdays(self, days: int = 7, today: date | None = None) -> list[dict[str,str]]:
+        """Same as AddressBook.get_upcoming_birthdays, computed over the whole columns at once."""
+        if self._changed:
+            self._apply_changes()
+        today = today or datetime.today().date()
+        day_of_year = today.timetuple().tm_yday - 1
+        year_length = 366 if _isleap(today.year) else 365
+
+        until = self._days_of(today.year) - day_of_year
+        # birthdays already passed this year come next year
+        until = np.where(until < 0, self._days_of(today.year + 1) + (year_length - day_of_year), until)
+        matches = np.flatnonzero(until <= days)
+        until = until[matches]
+
+        # Saturday (5) and Sunday (6) move to the following Monday
+        weekdays = (until + today.weekday()) % 7
+        until += np.where(weekdays >= 5, 7 - weekdays, 0)
+
+        # the names are sorted already, a stable sort by date keeps them in order within a date
+        order = np.argsort(until, kind="stable")
+        offsets, counts = np.unique(until[order], return_counts=True)
+        names = self._names[matches[order]].tolist()
+        result: list[dict[str, str]] = []
+        end = 0
+        for offset, count in zip(offsets.tolist(), counts.tolist()):
+            congratulation = (today + timedelta(days=offset)).strftime("%d.%m.%Y")
+            start, end = end, end + count
+            result += [{"name": name, "congratulation_date": congratulation} for name in names[start:end]]
+        return result